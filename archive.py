@@ -0,0 +1,245 @@
+# 对话音频归档模块：把每条话语追加到预分配的分段PCM文件，读取时内存映射零拷贝切片
+# 写入在后台线程完成，紧凑二进制索引记录轮次、位置、唤醒置信度和识别文本哈希
+import hashlib
+import mmap
+import os
+import queue
+import re
+import struct
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+import numpy as np
+from config import CONFIG
+from utils import audio_logger
+from metrics import registry
+
+ARCHIVE_UTTERANCES = registry.counter("archive_utterances_total", "已归档的话语数")
+ARCHIVE_DROPPED = registry.counter("archive_dropped_total", "写入队列满而丢弃的话语数")
+ARCHIVE_BYTES = registry.gauge("archive_bytes", "归档分段文件占用的磁盘空间")
+
+# 索引记录：轮次, 分段号, 段内采样偏移, 采样数, 归档时间, 唤醒置信度, 文本哈希
+_RECORD = struct.Struct("<QIIIdf8s")
+_INDEX_FILE = "index.bin"
+_SEGMENT_PATTERN = re.compile(r"seg_(\d{6,})\.pcm")
+_NO_SCORE = float("nan")
+
+
+class ArchiveRecord(NamedTuple):
+    turn_id: int
+    segment: int
+    offset: int
+    length: int
+    timestamp: float
+    wake_score: float
+    text_hash: bytes
+
+
+def transcript_hash(text: str) -> bytes:
+    return hashlib.blake2b((text or "").encode("utf-8"), digest_size=8).digest()
+
+
+class AudioArchive:
+    """分段音频归档：seg_NNNNNN.pcm按segment_seconds预分配，int16单声道"""
+
+    def __init__(self, directory: str = None, sample_rate: int = None):
+        config = CONFIG["audio_archive"]
+        self.directory = directory or config["directory"]
+        self.sample_rate = sample_rate or CONFIG["sample_rate"]
+        self.segment_samples = int(config["segment_seconds"] * self.sample_rate)
+        self.retention = CONFIG["max_retention"]
+        self.lock = threading.Lock()
+        self.records: List[ArchiveRecord] = []
+        self.segment_sizes: Dict[int, int] = {}    # 分段号 → 预分配采样数
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._segment = 0
+        self._position = 0
+        self._queue = queue.Queue(maxsize=config["queue_size"])
+        self._thread: Optional[threading.Thread] = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"seg_{segment:06d}.pcm")
+
+    def _load(self):
+        """读取已有索引，丢弃分段文件缺失的记录，删除索引中没有记录的分段，从最后一条记录之后继续写"""
+        path = os.path.join(self.directory, _INDEX_FILE)
+        data, usable = b"", 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            usable = len(data) - len(data) % _RECORD.size    # 忽略写了一半的尾记录
+            for fields in _RECORD.iter_unpack(data[:usable]):
+                record = ArchiveRecord(*fields)
+                if record.segment not in self.segment_sizes:
+                    segment_path = self._segment_path(record.segment)
+                    if not os.path.exists(segment_path):
+                        continue
+                    self.segment_sizes[record.segment] = os.path.getsize(segment_path) // 2
+                self.records.append(record)
+        found = self._remove_orphans()
+        if self.records:
+            last = self.records[-1]
+            self._segment, self._position = last.segment, last.offset + last.length
+        elif found:
+            # 编号接着目录中已有的最大分段号，不与上次运行的文件重名
+            self._segment = max(found) + 1
+        self._index = open(path, "wb" if not self.records else "ab")
+        if self.records and usable != len(data):
+            self._rewrite_index()
+        self._update_size()
+
+    def _remove_orphans(self) -> List[int]:
+        """删除索引中没有记录的分段文件（记录已过期或索引丢失），否则max_retention管不到它们；返回目录中出现过的分段号"""
+        found = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_PATTERN.fullmatch(name)
+            if match is None:
+                continue
+            segment = int(match.group(1))
+            found.append(segment)
+            if segment in self.segment_sizes:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+                audio_logger.info(f"🗄️ 删除无索引的归档分段: {name}")
+            except OSError as e:
+                audio_logger.debug(f"归档分段删除失败: {e}")
+        return found
+
+    def _rewrite_index(self):
+        path = os.path.join(self.directory, _INDEX_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for record in self.records:
+                f.write(_RECORD.pack(*record))
+        self._index.close()
+        os.replace(tmp_path, path)
+        self._index = open(path, "ab")
+
+    def _update_size(self):
+        ARCHIVE_BYTES.set(sum(self.segment_sizes.values()) * 2)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer_loop, name="audio-archive", daemon=True)
+            self._thread.start()
+            audio_logger.info(f"🗄️ 音频归档已启动: {self.directory}")
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._index.close()
+
+    def submit(self, turn_id: int, audio: np.ndarray, wake_score: float = None, text: str = ""):
+        """提交一条话语，立即返回；队列满时丢弃而不阻塞调用方"""
+        try:
+            self._queue.put_nowait((turn_id, audio, wake_score, text, time.time()))
+        except queue.Full:
+            ARCHIVE_DROPPED.inc()
+            audio_logger.warning(f"⚠️ 归档队列已满，丢弃第 {turn_id} 轮音频")
+
+    def _writer_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._write(*item)
+                self.prune()
+            except Exception as e:
+                audio_logger.error(f"❌ 音频归档写入失败: {e}")
+
+    def _open_segment(self, segment: int, samples: int):
+        """预分配分段文件，避免逐次追加导致文件系统碎片和元数据更新"""
+        with open(self._segment_path(segment), "wb") as f:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, samples * 2)
+            else:
+                f.truncate(samples * 2)
+        self.segment_sizes[segment] = samples
+        self._update_size()
+
+    def _write(self, turn_id, audio, wake_score, text, timestamp):
+        audio = np.asarray(audio)
+        if audio.dtype != np.int16:
+            audio = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        audio = audio.reshape(-1)
+        length = len(audio)
+
+        with self.lock:
+            if self._segment not in self.segment_sizes or \
+                    self._position + length > self.segment_sizes[self._segment]:
+                if self._segment in self.segment_sizes:
+                    self._segment += 1
+                # 超长话语单独占一个更大的分段
+                self._open_segment(self._segment, max(self.segment_samples, length))
+                self._position = 0
+            segment, offset = self._segment, self._position
+            self._position += length
+
+        with open(self._segment_path(segment), "r+b") as f:
+            f.seek(offset * 2)
+            f.write(audio.tobytes())
+
+        record = ArchiveRecord(turn_id, segment, offset, length, timestamp,
+                               _NO_SCORE if wake_score is None else wake_score,
+                               transcript_hash(text))
+        with self.lock:
+            self._index.write(_RECORD.pack(*record))
+            self._index.flush()
+            self.records.append(record)
+        ARCHIVE_UTTERANCES.inc()
+
+    def prune(self):
+        """按max_retention删除过期记录；分段内记录全部过期且不再写入时删除文件"""
+        cutoff = time.time() - self.retention
+        with self.lock:
+            if not self.records or self.records[0].timestamp >= cutoff:
+                return
+            self.records = [r for r in self.records if r.timestamp >= cutoff]
+            live = {r.segment for r in self.records} | {self._segment}
+            for segment in [s for s in self.segment_sizes if s not in live]:
+                del self.segment_sizes[segment]
+                # 仍被外部切片引用的映射由GC释放，这里只取消登记
+                self._maps.pop(segment, None)
+                try:
+                    os.remove(self._segment_path(segment))
+                except OSError as e:
+                    audio_logger.debug(f"归档分段删除失败: {e}")
+            self._rewrite_index()
+            self._update_size()
+
+    def _map(self, segment: int) -> mmap.mmap:
+        mapped = self._maps.get(segment)
+        if mapped is None:
+            with open(self._segment_path(segment), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped
+
+    def read(self, record: ArchiveRecord) -> np.ndarray:
+        """返回话语的int16只读视图（直接映射文件页，不复制）"""
+        with self.lock:
+            mapped = self._map(record.segment)
+        return np.frombuffer(mapped, dtype=np.int16, count=record.length, offset=record.offset * 2)
+
+    def find(self, turn_id: int) -> Optional[ArchiveRecord]:
+        """最近一条该轮次的记录（轮次号在进程重启后会重新计数）"""
+        with self.lock:
+            for record in reversed(self.records):
+                if record.turn_id == turn_id:
+                    return record
+        return None
+
+    def slice(self, turn_id: int) -> Optional[np.ndarray]:
+        record = self.find(turn_id)
+        return self.read(record) if record is not None else None
+
+    def list_records(self) -> List[ArchiveRecord]:
+        with self.lock:
+            return list(self.records)
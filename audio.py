@@ -1,17 +1,38 @@
 # 音频处理模块：负责音频录制、播放和音频流管理
 # 提供音频录制、停止、缓冲区清理等功能
 # 完整实现AudioManager类
+import contextlib
+import threading
+import time
+from time import monotonic as _monotonic
+import numpy as np
+import sounddevice as sd
+from config import CONFIG
+from utils import logger, state
+from devices import portaudio_lock, input_device_name
+from metrics import AUDIO_XRUNS, AUDIO_OVERFLOWS
+from profiling import profiled
+
 class AudioManager:
-    ""长期存活音频流管理器""
+    """长期存活音频流管理器"""
     
     def __init__(self, device_id, sample_rate, chunk_size):
         self.device_id = device_id
+        # 打开流时记录的设备名，设备看门狗据此判断设备是否被拔出
+        self.device_name = None
         self.sample_rate = sample_rate
         self.chunk_size = chunk_size
         self.stream = None
         self.is_active = False
         self.audio_buffer = []
         self.lock = threading.Lock()
+        # 采集流累计采样数，用作特征缓存等的绝对偏移
+        self.total_samples = 0
+        self._record_start = 0
+        self.last_recording_offset = None
+        # 最近一次回调的monotonic时间，供设备看门狗判断流是否停滞
+        self.last_callback = None
+        self.listeners = []
     
     def start_stream(self):
         if self.stream is not None:
@@ -19,15 +40,18 @@ class AudioManager:
         
         try:
             logger.info("🔧 启动长期存活音频流...")
-            self.stream = sd.InputStream(
-                samplerate=self.sample_rate,
-                channels=1,
-                dtype=np.int16,
-                device=self.device_id,
-                blocksize=int(self.sample_rate * self.chunk_size),
-                callback=self._audio_callback
-            )
-            self.stream.start()
+            self.last_callback = None
+            with portaudio_lock:
+                self.stream = sd.InputStream(
+                    samplerate=self.sample_rate,
+                    channels=1,
+                    dtype=np.int16,
+                    device=self.device_id,
+                    blocksize=int(self.sample_rate * self.chunk_size),
+                    callback=self._audio_callback
+                )
+                self.stream.start()
+            self.device_name = input_device_name(self.stream.device)
             self.is_active = True
             logger.info("✅ 音频流启动成功")
         except Exception as e:
@@ -41,28 +65,51 @@ class AudioManager:
         try:
             logger.info("🛑 停止音频流...")
             self.is_active = False
-            self.stream.stop()
-            self.stream.close()
+            with portaudio_lock:
+                self.stream.stop()
+                self.stream.close()
             self.stream = None
             logger.info("✅ 音频流已停止")
         except Exception as e:
             logger.error(f"❌ 停止音频流失败: {e}")
     
+    @profiled("audio_callback")
     def _audio_callback(self, indata, frames, time, status):
+        self.last_callback = _monotonic()
         if status:
             logger.warning(f"音频回调状态: {status}")
+            AUDIO_XRUNS.labels("callback").inc()
+            if status.input_overflow:
+                AUDIO_OVERFLOWS.labels("callback").inc()
         
         if self.is_active and not state.is_speaking:
             audio_chunk = indata.astype(np.float32) / 32768.0
             audio_chunk = np.squeeze(audio_chunk)
             
             with self.lock:
+                offset = self.total_samples
+                self.total_samples += len(audio_chunk)
                 if state.is_recording:
                     self.audio_buffer.extend(audio_chunk)
+            for listener in self.listeners:
+                listener(offset, audio_chunk)
+    
+    def add_listener(self, listener):
+        """注册采集块监听器listener(offset, samples)，在音频回调中调用，必须立即返回"""
+        self.listeners.append(listener)
+    
+    def callback_age(self):
+        """距最近一次回调的秒数；流已失效时为无穷大，尚未收到回调时为None"""
+        if self.stream is not None and not self.stream.active:
+            return float("inf")
+        if self.last_callback is None:
+            return None
+        return _monotonic() - self.last_callback
     
     def start_recording(self):
         with self.lock:
             self.audio_buffer.clear()
+            self._record_start = self.total_samples
             state.is_recording = True
             logger.info("🎤 开始录音...")
     
@@ -73,6 +120,7 @@ class AudioManager:
             self.audio_buffer.clear()
             
             if audio_data is not None and len(audio_data) > 0:
+                self.last_recording_offset = self._record_start
                 duration = len(audio_data) / self.sample_rate
                 logger.info(f"✅ 录音完成，时长: {duration:.2f}秒")
                 return audio_data
@@ -115,8 +163,8 @@ class AudioManager:
         return self.stop_recording()
 
 @contextlib.contextmanager
-    def audio_session(audio_manager):
-    ""音频会话管理器""
+def audio_session(audio_manager):
+    """音频会话管理器"""
     try:
         audio_manager.start_stream()
         yield audio_manager
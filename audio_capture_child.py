@@ -0,0 +1,70 @@
+# 音频采集子进程入口：spawn子进程只导入本模块（numpy、shared_memory和sounddevice）
+# 不经过main.py，避免子进程重新导入faster_whisper、ctranslate2、openwakeword等主进程依赖
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+# 共享内存头部字段（int64）
+WRITE_INDEX = 0      # 累计写入帧数（绝对采样偏移）
+OVERFLOWS = 1        # input_overflow次数
+XRUNS = 2            # 回调状态异常次数
+DROPPED = 3          # 播放期间丢弃的帧数
+PAUSED = 4           # 主进程设置：播放中暂停写入
+HEARTBEAT = 5        # 最近一次回调的monotonic时间(ns)
+READY = 6            # 子进程音频流已启动
+STOP = 7             # 主进程请求停止
+HEADER_FIELDS = 8
+HEADER_BYTES = HEADER_FIELDS * 8
+
+
+def map_buffers(buf, capacity):
+    header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buf)
+    ring = np.ndarray((capacity,), dtype=np.int16, buffer=buf, offset=HEADER_BYTES)
+    return header, ring
+
+
+def capture_main(shm_name, capacity, device_id, sample_rate, blocksize):
+    """子进程入口：单生产者写入环形缓冲区，先写数据再推进写索引"""
+    import sounddevice as sd
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    header, ring = map_buffers(shm.buf, capacity)
+
+    def callback(indata, frames, time_info, status):
+        if status:
+            header[XRUNS] += 1
+            if status.input_overflow:
+                header[OVERFLOWS] += 1
+        header[HEARTBEAT] = time.monotonic_ns()
+
+        if header[PAUSED]:
+            header[DROPPED] += frames
+            return
+
+        write_index = int(header[WRITE_INDEX])
+        pos = write_index % capacity
+        first = min(frames, capacity - pos)
+        ring[pos:pos + first] = indata[:first, 0]
+        if frames > first:
+            ring[:frames - first] = indata[first:, 0]
+        header[WRITE_INDEX] = write_index + frames
+
+    try:
+        with sd.InputStream(
+            samplerate=sample_rate,
+            channels=1,
+            dtype=np.int16,
+            device=device_id,
+            blocksize=blocksize,
+            callback=callback
+        ):
+            header[READY] = 1
+            while not header[STOP]:
+                time.sleep(0.05)
+    finally:
+        header[READY] = 0
+        try:
+            shm.close()
+        except BufferError:
+            # 回调闭包仍持有视图，进程退出时自动释放
+            pass
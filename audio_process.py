@@ -0,0 +1,272 @@
+# 进程隔离音频采集模块：在独立子进程中运行音频流，避免主进程GIL/GC停顿导致溢出
+# 通过multiprocessing.shared_memory环形缓冲区传递int16帧，主进程零拷贝读取
+import multiprocessing
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from config import CONFIG
+from utils import audio_logger, state
+from metrics import registry, AUDIO_XRUNS, AUDIO_OVERFLOWS
+from devices import input_device_name, add_playback_listener
+import audio_capture_child
+from audio_capture_child import (
+    WRITE_INDEX, OVERFLOWS, XRUNS, DROPPED, PAUSED, HEARTBEAT, READY, STOP, HEADER_BYTES,
+    map_buffers, capture_main,
+)
+
+
+class ProcessAudioManager:
+    """子进程采集音频流管理器，接口与AudioManager一致"""
+
+    def __init__(self, device_id, sample_rate, chunk_size):
+        self.device_id = device_id
+        # 打开流时记录的设备名，设备看门狗据此判断设备是否被拔出
+        self.device_name = None
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.capacity = int(sample_rate * CONFIG["audio_capture"]["ring_seconds"])
+        self.is_active = False
+        self.process = None
+        self.shm = None
+        self._header = None
+        self._ring = None
+        self._record_start = None
+        self.last_recording_offset = None
+        self.reader_overruns = 0
+        # 重启子进程后写索引从这里继续，保证绝对偏移在整个会话内单调递增
+        self._next_offset = 0
+        self.listeners = []
+        self._pump_thread = None
+        self._pump_stop = threading.Event()
+
+        # 与AudioManager保持兼容（AudioBufferCleaner会清理它）
+        self.audio_buffer = []
+        self.lock = threading.Lock()
+        registry.add_collector(self._export_metrics)
+        # 播放开始/结束时立即通知子进程暂停/恢复写入，不等下一次录音
+        add_playback_listener(lambda _: self._sync_paused())
+
+    def start_stream(self):
+        if self.process is not None:
+            return
+
+        audio_logger.info("🔧 启动子进程音频采集...")
+        self.shm = shared_memory.SharedMemory(create=True, size=HEADER_BYTES + self.capacity * 2)
+        self._header, self._ring = map_buffers(self.shm.buf, self.capacity)
+        self._header[:] = 0
+        self._header[WRITE_INDEX] = self._next_offset
+
+        # spawn避免fork已加载模型的主进程
+        context = multiprocessing.get_context("spawn")
+        self.process = context.Process(
+            target=capture_main,
+            args=(self.shm.name, self.capacity, self.device_id, self.sample_rate,
+                  int(self.sample_rate * self.chunk_size)),
+            name="audio-capture",
+            daemon=True
+        )
+        # spawn子进程会按__main__重新导入主模块；启动期间换成最小入口模块，子进程不再导入main.py的依赖
+        main_module = sys.modules["__main__"]
+        sys.modules["__main__"] = audio_capture_child
+        try:
+            self.process.start()
+        finally:
+            sys.modules["__main__"] = main_module
+
+        deadline = time.time() + 10
+        while not self._header[READY]:
+            if not self.process.is_alive() or time.time() > deadline:
+                self.stop_stream()
+                raise RuntimeError("子进程音频流启动失败")
+            time.sleep(0.05)
+
+        self.is_active = True
+        self.device_name = input_device_name(self.device_id)
+        if self.listeners:
+            self._pump_stop.clear()
+            self._pump_thread = threading.Thread(target=self._pump_loop, name="audio-pump", daemon=True)
+            self._pump_thread.start()
+        audio_logger.info(f"✅ 子进程音频流启动成功 (pid: {self.process.pid})")
+
+    def stop_stream(self):
+        if self.process is None:
+            return
+
+        audio_logger.info("🛑 停止子进程音频采集...")
+        self.is_active = False
+        if self._pump_thread is not None:
+            self._pump_stop.set()
+            self._pump_thread.join(timeout=2)
+            self._pump_thread = None
+        stats = self.get_capture_stats()
+        self._header[STOP] = 1
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
+
+        self._next_offset = self.write_index
+        self._header = None
+        self._ring = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        audio_logger.info(f"✅ 音频流已停止 (溢出: {stats['overflows']}, xrun: {stats['xruns']}, 读取覆盖: {stats['reader_overruns']})")
+
+    def _sync_paused(self):
+        header = self._header
+        if header is not None:
+            header[PAUSED] = 1 if state.is_speaking else 0
+
+    @property
+    def write_index(self) -> int:
+        return int(self._header[WRITE_INDEX])
+
+    def _clamp_start(self, start: int):
+        """读取过慢、最旧数据已被覆盖时从仍有效的位置开始读，并计一次读取覆盖"""
+        oldest = self.write_index - self.capacity
+        if start < oldest:
+            self.reader_overruns += 1
+            return oldest, True
+        return start, False
+
+    def _views(self, start: int, end: int):
+        if end <= start:
+            return ()
+        pos = start % self.capacity
+        length = end - start
+        first = min(length, self.capacity - pos)
+        if first == length:
+            return (self._ring[pos:pos + length],)
+        return (self._ring[pos:], self._ring[:length - first])
+
+    def get_views(self, start: int, end: int):
+        """返回[start, end)绝对偏移范围在环形缓冲区中的零拷贝视图（1或2段）"""
+        start, _ = self._clamp_start(start)
+        return self._views(start, end)
+
+    def read_range(self, start: int, end: int):
+        """拷贝出[start, end)范围的float32音频；一次读取最多计一次读取覆盖"""
+        start, overrun = self._clamp_start(start)
+        views = self._views(start, end)
+        if not views:
+            return None
+        audio = np.concatenate(views).astype(np.float32) / 32768.0
+        # 拷贝期间写入端追上了读取位置，开头部分可能已被新数据覆盖
+        lost = self.write_index - self.capacity - start
+        if lost > 0:
+            audio = audio[lost:]
+            if not overrun:
+                self.reader_overruns += 1
+        return audio
+
+    def add_listener(self, listener):
+        """注册采集块监听器listener(offset, samples)，由主进程的转发线程按块调用"""
+        self.listeners.append(listener)
+
+    def _pump_loop(self):
+        """子进程回调不在主进程里，按块长轮询写索引，把新写入的音频转发给监听器"""
+        position = self.write_index
+        while not self._pump_stop.wait(self.chunk_size):
+            end = self.write_index
+            if end <= position:
+                continue
+            audio = self.read_range(position, end)
+            if audio is not None:
+                offset = end - len(audio)
+                for listener in self.listeners:
+                    listener(offset, audio)
+            position = end
+
+    def start_recording(self):
+        self._sync_paused()
+        self._record_start = self.write_index
+        state.is_recording = True
+        audio_logger.info("🎤 开始录音...")
+
+    def stop_recording(self):
+        state.is_recording = False
+        if self._record_start is None:
+            return None
+        start, end = self._record_start, self.write_index
+        self._record_start = None
+        audio_data = self.read_range(start, end)
+
+        if audio_data is not None and len(audio_data) > 0:
+            self.last_recording_offset = end - len(audio_data)
+            duration = len(audio_data) / self.sample_rate
+            audio_logger.info(f"✅ 录音完成，时长: {duration:.2f}秒")
+            return audio_data
+        else:
+            audio_logger.warning("⚠️ 未录制到音频")
+            return None
+
+    def record_for_duration(self, duration):
+        self.start_recording()
+        time.sleep(duration)
+        return self.stop_recording()
+
+    def record_until_silence(self, silence_duration, max_duration):
+        self.start_recording()
+
+        silence_start = None
+        start_time = time.time()
+        window = int(self.sample_rate / 10)
+        threshold = CONFIG["volume_threshold"] * 32768.0
+
+        while True:
+            time.sleep(0.1)
+            self._sync_paused()
+
+            if time.time() - start_time > max_duration:
+                audio_logger.info("⏰ 达到最大录音时长")
+                break
+
+            end = self.write_index
+            if end - self._record_start <= 0:
+                continue
+            views = self.get_views(max(self._record_start, end - window), end)
+            energy = sum(float(np.dot(v, v.astype(np.float64))) for v in views)
+            count = sum(len(v) for v in views)
+            volume = np.sqrt(energy / count)
+
+            if volume > threshold:
+                silence_start = None
+            else:
+                if silence_start is None:
+                    silence_start = time.time()
+                elif time.time() - silence_start > silence_duration:
+                    audio_logger.info("🔇 检测到静音，停止录音")
+                    break
+
+        return self.stop_recording()
+
+    def callback_age(self):
+        """距子进程最近一次回调的秒数；子进程已退出时为无穷大"""
+        if self.process is None:
+            return None
+        if not self.process.is_alive():
+            return float("inf")
+        return self.get_capture_stats()["callback_age"]
+
+    def _export_metrics(self):
+        if self._header is None:
+            return
+        AUDIO_XRUNS.labels("process").sync(self._header[XRUNS])
+        AUDIO_OVERFLOWS.labels("process").sync(self._header[OVERFLOWS])
+    
+    def get_capture_stats(self) -> dict:
+        """采集统计：溢出、xrun、丢帧和读取覆盖次数"""
+        if self._header is None:
+            return {"overflows": 0, "xruns": 0, "dropped_frames": 0,
+                    "reader_overruns": self.reader_overruns, "callback_age": None}
+        heartbeat = int(self._header[HEARTBEAT])
+        return {
+            "overflows": int(self._header[OVERFLOWS]),
+            "xruns": int(self._header[XRUNS]),
+            "dropped_frames": int(self._header[DROPPED]),
+            "reader_overruns": self.reader_overruns,
+            "callback_age": (time.monotonic_ns() - heartbeat) / 1e9 if heartbeat else None,
+        }
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# TTS解码基准：对比流式MP3解码与pydub(ffmpeg子进程)解码
+# 用法: python bench_tts.py --mp3 reply.mp3  或  python bench_tts.py --text "很长的回复..."
+import argparse
+import asyncio
+import io
+import time
+import numpy as np
+from pydub import AudioSegment
+from config import CONFIG
+from tts import StreamingMp3Decoder
+
+# edge_tts单次推送的MP3数据量约为数KB
+EDGE_TTS_CHUNK_BYTES = 4096
+
+DEFAULT_TEXT = "今天的天气预报显示，上午多云转晴，午后局部地区可能出现雷阵雨，气温在二十到二十八度之间。" * 12
+
+
+async def fetch_mp3(text: str) -> bytes:
+    import edge_tts
+    tts = edge_tts.Communicate(text=text, voice=CONFIG["voice"])
+    chunks = []
+    async for chunk in tts.stream():
+        if chunk["type"] == "audio":
+            chunks.append(chunk["data"])
+    return b"".join(chunks)
+
+
+def bench_pydub(mp3: bytes) -> dict:
+    start = time.perf_counter()
+    # 原实现：逐块 bytes += 拼接后一次性解码
+    data = b""
+    for i in range(0, len(mp3), EDGE_TTS_CHUNK_BYTES):
+        data += mp3[i:i + EDGE_TTS_CHUNK_BYTES]
+    audio = AudioSegment.from_mp3(io.BytesIO(data))
+    audio = audio.set_channels(1).set_frame_rate(CONFIG["sample_rate"])
+    pcm = np.array(audio.get_array_of_samples())
+    total = time.perf_counter() - start
+    return {"total": total, "first_audio": total, "samples": len(pcm)}
+
+
+def bench_streaming(mp3: bytes) -> dict:
+    sample_rate = CONFIG["sample_rate"]
+    decoder = StreamingMp3Decoder(sample_rate, int(sample_rate * CONFIG["tts"]["block_ms"] / 1000))
+    start = time.perf_counter()
+    first_audio = None
+    samples = 0
+    for i in range(0, len(mp3), EDGE_TTS_CHUNK_BYTES):
+        for block in decoder.feed(mp3[i:i + EDGE_TTS_CHUNK_BYTES]):
+            if first_audio is None:
+                first_audio = time.perf_counter() - start
+            samples += len(block)
+    for block in decoder.flush():
+        samples += len(block)
+    total = time.perf_counter() - start
+    return {"total": total, "first_audio": first_audio or total, "samples": samples}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTS解码基准")
+    parser.add_argument("--mp3", help="已保存的edge_tts MP3文件")
+    parser.add_argument("--text", default=DEFAULT_TEXT, help="未指定--mp3时在线合成的文本")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.mp3:
+        with open(args.mp3, "rb") as f:
+            mp3 = f.read()
+    else:
+        mp3 = asyncio.run(fetch_mp3(args.text))
+
+    print(f"MP3: {len(mp3) / 1024:.1f} KB, 重复 {args.repeat} 次")
+    for name, bench in (("pydub", bench_pydub), ("streaming", bench_streaming)):
+        results = [bench(mp3) for _ in range(args.repeat)]
+        total = sorted(r["total"] for r in results)[len(results) // 2]
+        first = sorted(r["first_audio"] for r in results)[len(results) // 2]
+        duration = results[0]["samples"] / CONFIG["sample_rate"]
+        print(f"{name:>10}: 总耗时 {total * 1000:7.1f} ms, 首块 {first * 1000:7.1f} ms, "
+              f"音频 {duration:.1f} s, 实时率 {total / duration:.4f}")
+
+
+if __name__ == "__main__":
+    main()
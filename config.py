@@ -13,13 +13,29 @@ CONFIG = {
     "idle_timeout": 300,
     "max_retention": 600,
     
+    # 内存监控配置（后台采样RSS，越过阈值时在空闲期分级清理）
+    "memory_governor": {
+        "sample_interval": 5,          # RSS采样间隔(秒)
+        "trend_window": 24,            # 趋势检测采样数（约2分钟）
+        "leak_slope_mb_per_min": 2.0,  # 持续增长超过该斜率视为疑似泄漏
+        "rss_soft_mb": 600,            # 超过后执行缓存+分代GC
+        "rss_hard_mb": 900,            # 超过后卸载模型
+        "idle_grace": 2.0,             # 对话结束后至少空闲多久才清理(秒)
+        "cleanup_cooldown": 60,        # 同级清理的最小间隔(秒)
+    },
+    
     # 添加缺失的配置项
     "listen_duration": 1.5,
     "silence_duration": 1.0,
     "max_conversation_time": 30,
     "audio_chunk_size": 0.05,
     "volume_threshold": 0.008,
-    "cleanup_interval": 5,
+    
+    # 音频采集模式: "thread"(回调线程) 或 "process"(独立子进程+共享内存环形缓冲区)
+    "audio_capture": {
+        "mode": "thread",
+        "ring_seconds": 60,
+    },
     
     # 唤醒词配置
     "wake_words": ["你好小智"],  # 单一唤醒词
@@ -34,7 +50,17 @@ CONFIG = {
         "buffer_size": 1280,
         "sample_rate": 16000,
         "vad_threshold": 0.6,
-        "min_activation_count": 3
+        "min_activation_count": 3,  # 默认耐心帧数：连续超过阈值的帧数
+        "cooldown": 2.0,            # 默认触发后的冷却时间（秒）
+        # 多唤醒词：每项可单独设置threshold/patience/cooldown，并通过profile路由到不同音色/人设
+        # 例: {"model_path": "models/xiaozhi.onnx", "word": "你好小智", "threshold": 0.7, "profile": "default"}
+        # 为空时只加载model_path
+        "models": [],
+    },
+    
+    # 唤醒词路由配置：voice为空时使用全局音色，persona作为系统提示词，各profile使用独立会话
+    "wake_profiles": {
+        "default": {"voice": None, "persona": None, "session_id": "default"},
     },
     
     # 新增Whisper参数配置
@@ -55,10 +81,114 @@ CONFIG = {
         }
     },
     
+    # 领域词汇配置（设备名、专有名词）
+    "vocabulary": {
+        "enabled": True,
+        "words": ["小智", "客厅灯", "卧室灯", "空调", "加湿器", "扫地机器人", "窗帘"],
+        "prompt_template": "以下是普通话的句子，可能提到：{words}。",
+        "use_hotwords": False,       # 同时传hotwords（faster-whisper每次调用都会重新编码）
+        "pinyin_correction": True,   # 解码后按拼音近音纠错
+        "max_pinyin_distance": 1,    # 3字及以上词语允许的近音音节数（声母或韵母易混，见vocabulary._CONFUSABLE_*）；2字词须带声调读音完全相同
+        "correction_max_logprob": -0.5,  # 片段平均对数概率高于此值时不纠错（None为总是纠错）
+    },
+    
+    # Whisper预热配置（加载模型后用合成音频跑一遍各组参数）
+    "whisper_warmup": {
+        "enabled": True,
+        "audio_seconds": 2.0,
+    },
+    
+    # log-mel特征缓存（采集路径逐块喂入，按采集流偏移复用，容量跟随audio_capture.ring_seconds）
+    # 默认关闭：只用于未开启vad_filter的对话解码（VAD裁剪后的音频与采集流偏移不再对应），
+    # 而默认对话参数开启了vad_filter；即使关闭vad_filter，每段话语通常也只解码一次，
+    # 只有温度回退/批量回退重解同一段音频时才省下重复的特征计算
+    "feature_cache": {
+        "enabled": False,
+        "feed_wait": 0.2,   # 解码时等待最后几个采集块入缓存的最长时间（秒）
+    },
+    
+    # 批量转录配置（多路并发话语合并为一次CTranslate2解码）
+    "stt_batch": {
+        "enabled": False,
+        "window_ms": 40,        # 并发时的收集窗口
+        "max_wait_ms": 80,      # 单个请求最长排队时间
+        "max_batch_size": 4,
+        "bucket_seconds": 5,    # 按时长分桶，减少解码长度差异
+    },
+    
+    # 对话记忆配置（会话在idle_timeout秒无活动后过期）
+    "conversation": {
+        "token_budget": 1200,    # 历史+当前问题的估算token上限
+        "max_turns": 8,          # 每个会话最多保留的轮数
+        "summary_tokens": 150,   # 旧对话摘要的token上限
+        "max_sessions": 16,
+    },
+    
+    # 音频设备管理配置
+    "audio_device": {
+        "preferences": ["USB"],   # 设备名关键字，靠前的优先；都不匹配时排在最后
+        "probe_interval": 10.0,   # 后台重新探测设备的间隔（秒）
+        "startup_wait": 2.0,      # 启动时等待首次探测的最长时间，超时使用系统默认设备
+        "stall_blocks": 20,       # 超过多少个块时长没有回调视为采集流中断
+        "retry_interval": 1.0,    # 恢复失败后的重试间隔（秒）
+    },
+    
+    # 性能剖析配置：enabled时常开阶段CPU统计并在启动时采样一次；运行中可用信号开关采样剖析
+    "profiling": {
+        "enabled": False,
+        "signal": "SIGUSR1",
+        "interval": 0.005,        # 采样间隔（秒）
+        "duration": 30,           # 单次采样剖析时长（秒）
+        "output_dir": "profiles",
+    },
+    
+    # 对话音频归档配置（保留时长由max_retention决定）
+    "audio_archive": {
+        "enabled": False,
+        "directory": "audio_archive",
+        "segment_seconds": 600,   # 每个分段文件预分配的音频时长
+        "queue_size": 32,         # 待写入话语上限，满时丢弃
+    },
+    
+    # 流水线配置：每个阶段的工作协程数、输入队列长度和超时（秒，None为不限）
+    "pipeline": {
+        "stages": {
+            "wake": {"concurrency": 1, "queue_size": 2, "timeout": 5},
+            "endpoint": {"concurrency": 1, "queue_size": 1, "timeout": None},  # 录音时长由max_conversation_time限制
+            "stt": {"concurrency": 1, "queue_size": 2, "timeout": 30},  # 开启stt_batch时提升到max_batch_size
+            "llm": {"concurrency": 2, "queue_size": 2, "timeout": 20},
+            "tts": {"concurrency": 2, "queue_size": 2, "timeout": 10},  # 到首块音频为止
+            "playback": {"concurrency": 1, "queue_size": 2, "timeout": 120},
+        },
+        "tts_buffer_blocks": 50,   # 合成领先播放的最大块数
+        "barge_in": True,          # 新的唤醒取消仍在识别/回复/合成的上一轮（播放期间采集静音，助手自己的声音不会触发唤醒）
+    },
+    
+    # 语音合成配置
+    "tts": {
+        "block_ms": 100,   # 流式解码输出的PCM块时长
+    },
+    
     # 网络配置
     "cache_expire": 3600,
     "max_retries": 3,
     
+    # LLM客户端策略配置（max_retries为单轮最多尝试次数）
+    "llm": {
+        "endpoints": [],              # 备用API地址，对冲请求优先发往这里；为空时对冲到同一地址
+        "total_budget": 6.0,          # 单轮LLM总延迟预算（秒），超出后本地降级
+        "hedge_quantile": 0.95,       # 首个请求超过近期该分位延迟仍未返回时发出对冲请求
+        "hedge_default_delay": 1.5,   # 延迟样本不足10个时的对冲延迟
+        "hedge_delay_min": 0.5,
+        "hedge_delay_max": 3.0,
+        "latency_window": 50,         # 每个地址保留的延迟样本数
+        "backoff_base": 0.2,          # 重试退避（秒，指数增长并加随机抖动）
+        "backoff_max": 1.0,
+        "breaker_failures": 3,        # 连续失败次数达到后熔断
+        "breaker_reset": 30,          # 熔断后每隔多少秒放行一次探测请求
+        "fallback_reply": "网络有点不稳定，请稍后再问我一次。",
+    },
+    
     # 自适应噪声检测配置
     "adaptive_noise": {
         "enabled": True,
@@ -75,6 +205,15 @@ CONFIG = {
         }
     },
     
+    # 指标导出配置（Prometheus文本格式）
+    "metrics": {
+        "enabled": False,
+        "host": "127.0.0.1",
+        "port": 9108,
+        "textfile_path": None,     # 例如 /var/lib/node_exporter/voice_assistant.prom
+        "textfile_interval": 15,
+    },
+    
     # 唤醒词检测模式
     "wake_word_mode": "openwakeword"
 }
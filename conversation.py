@@ -0,0 +1,224 @@
+# 对话记忆模块：维护多轮对话历史，按token预算裁剪旧对话
+# 提供会话存储、token快速估算、历史摘要和请求体积统计功能
+import json
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional
+from config import CONFIG
+from utils import logger
+from metrics import registry
+
+# 每条消息的role/分隔符开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_CJK_PATTERN = re.compile(r'[　-〿㐀-䶿一-鿿＀-￯]')
+_WORD_PATTERN = re.compile(r'[A-Za-z0-9_]+')
+
+
+@lru_cache(maxsize=4096)
+def estimate_tokens(text: str) -> int:
+    """快速估算文本token数：汉字约1个/字，英文单词约4字符1个"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    words = _WORD_PATTERN.findall(text)
+    word_tokens = sum(max(1, (len(w) + 3) // 4) for w in words)
+    word_chars = sum(len(w) for w in words)
+    other = len(text) - cjk - word_chars - text.count(" ")
+    return cjk + word_tokens + max(0, other) // 2
+
+
+class _Message:
+    """单条消息，JSON片段只序列化一次"""
+    __slots__ = ("role", "content", "tokens", "encoded")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+        self.tokens = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        self.encoded = json.dumps(
+            {"role": role, "content": content}, ensure_ascii=False
+        ).encode("utf-8")
+
+
+@lru_cache(maxsize=16)
+def _persona_message(persona: str) -> _Message:
+    return _Message("system", persona)
+
+
+class ConversationSession:
+    """单个会话：保留最近若干轮，超出预算的旧对话折叠为摘要"""
+
+    def __init__(self, session_id: str):
+        config = CONFIG["conversation"]
+        self.session_id = session_id
+        self.token_budget = config["token_budget"]
+        self.summary_tokens = config["summary_tokens"]
+        self.messages = deque(maxlen=config["max_turns"] * 2)
+        self.summary: Optional[_Message] = None
+        self._summary_parts = deque()
+        self.history_tokens = 0
+        self.last_active = time.time()
+
+    def is_expired(self, now: float = None) -> bool:
+        now = now or time.time()
+        return now - self.last_active > CONFIG["idle_timeout"]
+
+    def add(self, role: str, content: str):
+        """追加一条消息，并裁剪到token预算内"""
+        if len(self.messages) == self.messages.maxlen:
+            self._fold(self.messages.popleft())
+        message = _Message(role, content)
+        self.messages.append(message)
+        self.history_tokens += message.tokens
+        self.last_active = time.time()
+        self._trim(0)
+
+    def add_turn(self, query: str, reply: str):
+        self.add("user", query)
+        self.add("assistant", reply)
+
+    def _trim(self, reserve: int):
+        """丢弃最旧的消息直到历史+预留不超过预算"""
+        summary_tokens = self.summary.tokens if self.summary else 0
+        while self.messages and self.history_tokens + summary_tokens + reserve > self.token_budget:
+            self._fold(self.messages.popleft())
+            summary_tokens = self.summary.tokens if self.summary else 0
+
+    def _fold(self, message: _Message):
+        """将被裁剪的消息压缩进摘要（保留首句，摘要超限时丢弃最旧部分）"""
+        self.history_tokens -= message.tokens
+        first_sentence = re.split(r'[。！？!?\n]', message.content, maxsplit=1)[0][:40]
+        speaker = "用户" if message.role == "user" else "助手"
+        self._summary_parts.append(f"{speaker}: {first_sentence}")
+
+        text = "；".join(self._summary_parts)
+        while len(self._summary_parts) > 1 and estimate_tokens(text) > self.summary_tokens:
+            self._summary_parts.popleft()
+            text = "；".join(self._summary_parts)
+        self.summary = _Message("system", f"此前对话摘要：{text}")
+
+    def build_payload(self, fields: Dict, query: str, persona: str = None) -> tuple[bytes, int]:
+        """拼接请求体：历史消息复用已序列化的片段，只编码当前问题，persona作为系统提示词置于最前
+
+        Returns:
+            (请求体字节, 估算token数)
+        """
+        current = _Message("user", query)
+        system = _persona_message(persona) if persona else None
+        tokens = current.tokens + (system.tokens if system else 0)
+        self._trim(tokens)
+
+        parts = [system.encoded] if system else []
+        if self.summary is not None:
+            parts.append(self.summary.encoded)
+            tokens += self.summary.tokens
+        for message in self.messages:
+            parts.append(message.encoded)
+            tokens += message.tokens
+        parts.append(current.encoded)
+
+        prefix = json.dumps(fields, ensure_ascii=False)[:-1].encode("utf-8")
+        separator = b', "messages": [' if fields else b'"messages": ['
+        body = b"".join((prefix, separator, b", ".join(parts), b"]}"))
+        return body, tokens
+
+    def get_messages(self) -> List[Dict[str, str]]:
+        messages = [{"role": m.role, "content": m.content} for m in self.messages]
+        if self.summary is not None:
+            messages.insert(0, {"role": self.summary.role, "content": self.summary.content})
+        return messages
+
+    def clear(self):
+        self.messages.clear()
+        self._summary_parts.clear()
+        self.summary = None
+        self.history_tokens = 0
+
+
+class ConversationStore:
+    """会话存储：空闲超时过期，会话数量有上限"""
+
+    def __init__(self):
+        self.max_sessions = CONFIG["conversation"]["max_sessions"]
+        self.sessions: Dict[str, ConversationSession] = {}
+        self.lock = threading.Lock()
+        # (请求体字节, 估算token, 耗时秒)
+        self.payload_history = deque(maxlen=200)
+
+    def get(self, session_id: str = "default") -> ConversationSession:
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None and session.is_expired():
+                logger.info(f"💤 会话已过期，重置历史: {session_id}")
+                session = None
+            if session is None:
+                if len(self.sessions) >= self.max_sessions:
+                    oldest = min(self.sessions.values(), key=lambda s: s.last_active)
+                    del self.sessions[oldest.session_id]
+                session = ConversationSession(session_id)
+                self.sessions[session_id] = session
+            return session
+
+    def clear_expired(self):
+        """清理过期会话（可注册为内存清理回调）"""
+        now = time.time()
+        with self.lock:
+            expired = [sid for sid, s in self.sessions.items() if s.is_expired(now)]
+            for sid in expired:
+                del self.sessions[sid]
+        if expired:
+            logger.debug(f"💬 清理过期会话 {len(expired)} 个")
+
+    def record_payload(self, size_bytes: int, tokens: int, duration: float):
+        self.payload_history.append((size_bytes, tokens, duration))
+
+    def get_payload_stats(self) -> Dict[str, float]:
+        """请求体积与LLM延迟统计，slope_ms_per_kb为延迟随体积增长的线性斜率"""
+        if not self.payload_history:
+            return {}
+        count = len(self.payload_history)
+        sizes = [h[0] for h in self.payload_history]
+        latencies = [h[2] for h in self.payload_history]
+        avg_size = sum(sizes) / count
+        avg_latency = sum(latencies) / count
+
+        variance = sum((s - avg_size) ** 2 for s in sizes)
+        covariance = sum((s - avg_size) * (l - avg_latency) for s, l in zip(sizes, latencies))
+        slope = covariance / variance if variance > 0 else 0.0
+
+        return {
+            "requests": count,
+            "avg_bytes": avg_size,
+            "max_bytes": max(sizes),
+            "avg_tokens": sum(h[1] for h in self.payload_history) / count,
+            "avg_latency": avg_latency,
+            "slope_ms_per_kb": slope * 1000 * 1024,
+        }
+
+    def print_stats(self):
+        stats = self.get_payload_stats()
+        if not stats:
+            return
+        logger.info(
+            f"💬 LLM请求体积: 平均 {stats['avg_bytes']/1024:.1f} KB / {stats['avg_tokens']:.0f} tokens, "
+            f"平均延迟 {stats['avg_latency']:.2f}s, 每KB +{stats['slope_ms_per_kb']:.1f}ms"
+        )
+
+
+conversation_store = ConversationStore()
+
+
+def _token_cache_hit_ratio() -> float:
+    info = estimate_tokens.cache_info()
+    total = info.hits + info.misses
+    return info.hits / total if total else 0.0
+
+
+CACHE_HIT_RATIO = registry.gauge("cache_hit_ratio", "缓存命中率", ["cache"])
+CACHE_HIT_RATIO.labels("token_estimate").set_function(_token_cache_hit_ratio)
+LLM_PAYLOAD_BYTES = registry.gauge("llm_payload_bytes_avg", "近期LLM请求体平均字节数")
+LLM_PAYLOAD_BYTES.set_function(lambda: conversation_store.get_payload_stats().get("avg_bytes", 0.0))
@@ -0,0 +1,253 @@
+# 音频设备管理模块：后台探测输入设备、按偏好选择设备
+# 监测采集流停滞和设备丢失，在不重启进程的情况下切换到最佳可用设备并重新打开音频流
+import contextlib
+import threading
+import time
+from typing import List, Optional
+import sounddevice as sd
+from config import CONFIG
+from utils import audio_logger, state
+from metrics import registry
+
+AUDIO_RECOVERY = registry.histogram(
+    "audio_recovery_seconds", "采集流从检测到中断到恢复回调的耗时", [],
+    (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+AUDIO_RECOVERIES = registry.counter("audio_recoveries_total", "采集流恢复次数", ["reason", "result"])
+AUDIO_DEVICES = registry.gauge("audio_input_devices", "可用输入设备数")
+
+# sounddevice的模块级状态不是线程安全的：枚举设备、打开/关闭流、重新初始化PortAudio都必须持有此锁
+portaudio_lock = threading.RLock()
+_playback_lock = threading.Lock()
+_playback_count = 0
+_playback_listeners = []
+
+
+def add_playback_listener(listener):
+    """注册播放状态监听器listener(speaking)，开始和结束播放时各调用一次"""
+    _playback_listeners.append(listener)
+
+
+def _set_speaking(speaking: bool):
+    state.is_speaking = speaking
+    for listener in _playback_listeners:
+        listener(speaking)
+
+
+@contextlib.contextmanager
+def playback():
+    """标记输出流正在播放：期间state.is_speaking为真，采集丢弃麦克风数据（不让助手自己的声音触发唤醒和打断），
+    也不重新初始化PortAudio（会一并终止播放流）"""
+    global _playback_count
+    with _playback_lock:
+        _playback_count += 1
+        if _playback_count == 1:
+            _set_speaking(True)
+    try:
+        yield
+    finally:
+        with _playback_lock:
+            _playback_count -= 1
+            if _playback_count == 0:
+                _set_speaking(False)
+
+
+def playback_active() -> bool:
+    return _playback_count > 0
+
+
+def input_device_name(device) -> Optional[str]:
+    """输入设备名称（device为None时取默认输入设备），打开流时记录"""
+    try:
+        with portaudio_lock:
+            return sd.query_devices(device, kind="input")["name"]
+    except Exception:
+        return None
+
+
+class AudioDeviceManager:
+    """输入设备探测（带缓存）+ 采集流看门狗"""
+
+    def __init__(self):
+        self.config = CONFIG["audio_device"]
+        self.sample_rate = CONFIG["sample_rate"]
+        self.lock = threading.Lock()
+        self.devices: List[dict] = []
+        self.probed_at = 0.0
+        self._probed = threading.Event()
+        # 恢复期间暂停后台探测，设备列表由恢复流程刷新
+        self._recovering = threading.Event()
+        self._stop = threading.Event()
+        self._probe_thread: Optional[threading.Thread] = None
+        self._watch_thread: Optional[threading.Thread] = None
+        self.audio_manager = None
+        self.stats = {"recoveries": 0, "failures": 0, "last_recovery": None}
+
+    def start(self):
+        """启动后台探测，不阻塞调用方"""
+        if self._probe_thread is None:
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="audio-probe", daemon=True)
+            self._probe_thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_portaudio(self):
+        """PortAudio只在初始化时枚举设备，热插拔后需重新初始化；仅在持有portaudio_lock、没有打开的流且没有播放时调用"""
+        if hasattr(sd, "_terminate") and hasattr(sd, "_initialize"):
+            sd._terminate()
+            sd._initialize()
+
+    def _acquire_idle(self) -> bool:
+        """获取portaudio_lock并确认没有播放：重新初始化会终止播放流，播放期间等待；停止时返回False"""
+        deferred = False
+        while True:
+            portaudio_lock.acquire()
+            if not playback_active():
+                return True
+            portaudio_lock.release()
+            if not deferred:
+                audio_logger.info("🔊 正在播放，播放结束后再重新初始化PortAudio")
+                deferred = True
+            if self._stop.wait(0.1):
+                return False
+
+    def _enumerate(self) -> List[dict]:
+        """需持有portaudio_lock；已打开的采集设备不再校验（ALSA硬件设备被占用时会报忙）"""
+        manager = self.audio_manager
+        in_use = manager.device_id if manager is not None and manager.is_active else None
+        candidates = []
+        for index, device in enumerate(sd.query_devices()):
+            if device["max_input_channels"] <= 0:
+                continue
+            if index != in_use:
+                try:
+                    sd.check_input_settings(device=index, channels=1, samplerate=self.sample_rate, dtype="int16")
+                except Exception:
+                    continue
+            candidates.append({"index": index, "name": device["name"], "rank": self._rank(device["name"])})
+        return candidates
+
+    def probe(self, refresh: bool = False) -> List[dict]:
+        """枚举可用输入设备并按偏好排序；refresh时先重新初始化PortAudio（等待播放结束）"""
+        if refresh:
+            if not self._acquire_idle():
+                return []
+            try:
+                self._refresh_portaudio()
+                candidates = self._enumerate()
+            finally:
+                portaudio_lock.release()
+        else:
+            with portaudio_lock:
+                candidates = self._enumerate()
+        candidates.sort(key=lambda d: (d["rank"], d["index"]))
+
+        with self.lock:
+            self.devices = candidates
+            self.probed_at = time.time()
+        AUDIO_DEVICES.set(len(candidates))
+        self._probed.set()
+        return candidates
+
+    def _rank(self, name: str) -> int:
+        """偏好列表中越靠前的关键字排名越高，不匹配的排在最后"""
+        upper = name.upper()
+        for rank, keyword in enumerate(self.config["preferences"]):
+            if keyword.upper() in upper:
+                return rank
+        return len(self.config["preferences"])
+
+    def _probe_loop(self):
+        while not self._stop.is_set():
+            try:
+                if not self._recovering.is_set():
+                    self.probe()
+            except Exception as e:
+                audio_logger.error(f"❌ 音频设备探测失败: {e}")
+            self._stop.wait(self.config["probe_interval"])
+
+    def select_device(self, timeout: float = None):
+        """返回最佳输入设备；首次探测未完成时最多等待timeout秒，否则用系统默认设备"""
+        self._probed.wait(self.config["startup_wait"] if timeout is None else timeout)
+        with self.lock:
+            if self.devices:
+                device = self.devices[0]
+                audio_logger.info(f"使用音频输入设备: {device['index']} ({device['name']})")
+                return device["index"]
+        audio_logger.info(f"使用默认音频设备: {sd.default.device[0]}")
+        return sd.default.device[0]
+
+    def watch(self, audio_manager):
+        """启动看门狗：回调停止超过stall_blocks个块时长即视为中断并恢复"""
+        self.audio_manager = audio_manager
+        if self._watch_thread is None:
+            self._watch_thread = threading.Thread(target=self._watch_loop, name="audio-watchdog", daemon=True)
+            self._watch_thread.start()
+
+    def _stall_seconds(self) -> float:
+        return self.config["stall_blocks"] * CONFIG["audio_chunk_size"]
+
+    def _watch_loop(self):
+        while not self._stop.wait(self._stall_seconds() / 2):
+            manager = self.audio_manager
+            if not manager.is_active:
+                continue
+            age = manager.callback_age()
+            if age is None or age < self._stall_seconds():
+                continue
+            audio_logger.warning(f"⚠️ 音频流中断 ({age:.1f}秒无回调)，开始恢复")
+            self.recover()
+
+    def recover(self, reason: str = None) -> bool:
+        """关闭当前流，重新枚举设备并在最佳设备上重开，直到收到新回调；未给出reason时按重新枚举结果判断"""
+        manager = self.audio_manager
+        start_time = time.time()
+        # 重新初始化后设备序号可能变化，按打开流时记录的名称判断原设备是否还在
+        name = manager.device_name
+        self._recovering.set()
+        try:
+            manager.stop_stream()
+            return self._reopen(manager, reason, name, start_time)
+        finally:
+            self._recovering.clear()
+
+    def _reopen(self, manager, reason: Optional[str], name: Optional[str], start_time: float) -> bool:
+        while not self._stop.is_set():
+            try:
+                # 流已关闭，可以安全地重新初始化PortAudio
+                devices = self.probe(refresh=True)
+                if reason is None:
+                    lost = name is not None and name not in {d["name"] for d in devices}
+                    reason = "device_lost" if lost else "stall"
+                    audio_logger.warning(f"⚠️ 中断原因: {reason}")
+                if devices:
+                    manager.device_id = devices[0]["index"]
+                    manager.start_stream()
+                    if self._wait_for_callback(manager):
+                        elapsed = time.time() - start_time
+                        AUDIO_RECOVERY.observe(elapsed)
+                        AUDIO_RECOVERIES.labels(reason, "success").inc()
+                        self.stats["recoveries"] += 1
+                        self.stats["last_recovery"] = elapsed
+                        audio_logger.info(f"✅ 音频流已恢复: 设备 {devices[0]['name']}, 耗时 {elapsed:.2f}秒")
+                        return True
+                    manager.stop_stream()
+                else:
+                    audio_logger.warning("⚠️ 没有可用的音频输入设备")
+            except Exception as e:
+                audio_logger.error(f"❌ 音频流恢复失败: {e}")
+                manager.stop_stream()
+            AUDIO_RECOVERIES.labels(reason or "stall", "retry").inc()
+            self.stats["failures"] += 1
+            self._stop.wait(self.config["retry_interval"])
+        return False
+
+    def _wait_for_callback(self, manager) -> bool:
+        deadline = time.time() + self._stall_seconds()
+        while time.time() < deadline:
+            age = manager.callback_age()
+            if age is not None and age < self._stall_seconds():
+                return True
+            time.sleep(CONFIG["audio_chunk_size"])
+        return False
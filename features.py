@@ -0,0 +1,237 @@
+# 特征缓存模块：按采集流绝对采样偏移缓存log-mel特征
+# 采集路径逐块喂入，后台线程增量计算；对同一段音频的解码（含回退重解）复用已计算的帧
+import queue
+import threading
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+from config import CONFIG
+from utils import whisper_logger
+from metrics import CACHE_REQUESTS, registry
+
+FEATURE_FRAMES_COMPUTED = registry.counter("stt_feature_frames_computed_total", "增量计算的log-mel帧数")
+FEATURE_FRAMES_REUSED = registry.counter("stt_feature_frames_reused_total", "从缓存复用的log-mel帧数")
+
+# log10(1e-10)：全零窗口的log-mel值
+_SILENCE_LOG_MEL = -10.0
+
+
+class LogMelFeatureCache:
+    """增量log-mel特征缓存
+
+    帧f以采集流第f*hop个采样为中心。采集块经feed()入队，由后台线程extend()，
+    只计算新增的帧；保存的是归一化前的log10梅尔能量，超过max_seconds的旧帧随音频环形缓冲区一起淘汰。
+    """
+
+    def __init__(self, n_fft: int, hop_length: int, window: np.ndarray,
+                 mel_filters: np.ndarray, max_seconds: float):
+        self.n_fft = n_fft
+        self.hop = hop_length
+        self.half = n_fft // 2
+        self.window = window
+        self.mel_filters = mel_filters
+        self.max_frames = int(max_seconds * CONFIG["sample_rate"] / hop_length)
+        self.lock = threading.Lock()
+        self._updated = threading.Condition(self.lock)
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self.stats = {"hits": 0, "misses": 0, "frames_computed": 0, "frames_reused": 0}
+        self.reset()
+
+    def reset(self, offset: int = None):
+        self._blocks = deque()      # (首帧编号, 特征块(n_mels, k))
+        self._frames = 0
+        self._end = offset
+        self._next_frame = None if offset is None else offset // self.hop
+        # 流起点（或不连续处）之前没有音频：补n_fft//2个零作为首帧左侧上下文
+        self._tail_offset = None if offset is None else self._next_frame * self.hop - self.half
+        self._tail = np.zeros(0 if offset is None else offset - self._tail_offset, dtype=np.float32)
+
+    def feed(self, offset: int, samples: np.ndarray):
+        """采集路径调用：只入队，不在音频回调里计算特征"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._feed_loop, name="feature-cache", daemon=True)
+            self._thread.start()
+        self._queue.put((offset, samples))
+
+    def _feed_loop(self):
+        while True:
+            offset, samples = self._queue.get()
+            try:
+                self.extend(offset, samples)
+            except Exception as e:
+                whisper_logger.error(f"特征缓存更新失败: {e}")
+
+    def wait_for(self, end: int, timeout: float) -> bool:
+        """等待后台线程处理到采集偏移end（录音刚结束时最后一块可能还在队列中）"""
+        with self._updated:
+            return self._updated.wait_for(lambda: self._end is not None and self._end >= end, timeout)
+
+    @property
+    def first_frame(self):
+        return self._blocks[0][0] if self._blocks else self._next_frame
+
+    def log_mel(self, frames: np.ndarray) -> np.ndarray:
+        """(k, n_fft)加窗帧 → (n_mels, k) log10梅尔能量"""
+        spectrum = np.fft.rfft(frames * self.window, axis=-1)
+        magnitudes = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+        mel = self.mel_filters @ magnitudes.T
+        return np.log10(np.maximum(mel, 1e-10))
+
+    def extend(self, offset: int, samples: np.ndarray):
+        """追加[offset, offset+len)的音频，计算所有窗口已完整的新帧"""
+        with self.lock:
+            if self._end is None or offset > self._end:
+                # 首次或采集流不连续
+                self.reset(offset)
+            if offset + len(samples) <= self._end:
+                return
+            samples = np.asarray(samples[self._end - offset:], dtype=np.float32)
+            self._tail = np.concatenate((self._tail, samples))
+            self._end += len(samples)
+
+            last_frame = (self._end - self.half) // self.hop
+            count = last_frame - self._next_frame + 1
+            if count <= 0:
+                self._updated.notify_all()
+                return
+
+            start = self._next_frame * self.hop - self.half - self._tail_offset
+            frames = np.lib.stride_tricks.as_strided(
+                self._tail[start:],
+                shape=(count, self.n_fft),
+                strides=(self.hop * self._tail.strides[0], self._tail.strides[0]),
+                writeable=False
+            )
+            self._blocks.append((self._next_frame, self.log_mel(frames)))
+            self._frames += count
+            self._next_frame += count
+            self.stats["frames_computed"] += count
+            FEATURE_FRAMES_COMPUTED.inc(count)
+
+            # 只保留尚未计算的帧所需的音频
+            keep_from = self._next_frame * self.hop - self.half
+            self._tail = self._tail[keep_from - self._tail_offset:].copy()
+            self._tail_offset = keep_from
+
+            while self._frames > self.max_frames and len(self._blocks) > 1:
+                _, block = self._blocks.popleft()
+                self._frames -= block.shape[1]
+            self._updated.notify_all()
+
+    def get_frames(self, first: int, count: int):
+        """取帧[first, first+count)，缓存未完全覆盖时返回None"""
+        with self.lock:
+            if not self._blocks or first < self.first_frame or first + count > self._next_frame:
+                return None
+            parts = []
+            needed_first, needed_end = first, first + count
+            for block_first, block in self._blocks:
+                block_end = block_first + block.shape[1]
+                if block_end <= needed_first:
+                    continue
+                if block_first >= needed_end:
+                    break
+                parts.append(block[:, max(needed_first - block_first, 0):needed_end - block_first])
+            return parts[0] if len(parts) == 1 else np.concatenate(parts, axis=1)
+
+
+class CachedFeatureExtractor:
+    """替换WhisperModel.feature_extractor的包装器
+
+    在bind()上下文中、且送入的音频未被VAD裁剪时，真实音频部分的帧取自缓存，
+    只重新计算末尾补零区附近的几帧；其余情况交给原始特征提取器。
+    帧网格按采集流的hop对齐，起点不在网格上时与原算法相差不足一帧(10ms)；
+    开头的帧使用采集流中前面的真实音频作为上下文，而不是反射填充。
+    """
+
+    def __init__(self, base, cache: LogMelFeatureCache):
+        self.base = base
+        self.cache = cache
+        self._local = threading.local()
+
+    def __getattr__(self, item):
+        return getattr(self.base, item)
+
+    @contextmanager
+    def bind(self, offset: int, length: int):
+        previous = getattr(self._local, "binding", None)
+        self._local.binding = (offset, length)
+        try:
+            yield
+        finally:
+            self._local.binding = previous
+
+    def __call__(self, waveform: np.ndarray, padding=160, chunk_length=None):
+        binding = getattr(self._local, "binding", None)
+        if binding is not None and len(waveform) == binding[1]:
+            features = self._from_cache(waveform, binding[0], padding, chunk_length)
+            if features is not None:
+                return features
+        if binding is not None:
+            self._record(False)
+        return self.base(waveform, padding=padding, chunk_length=chunk_length)
+
+    def _record(self, hit: bool):
+        key = "hits" if hit else "misses"
+        self.cache.stats[key] += 1
+        CACHE_REQUESTS.labels("log_mel", "hit" if hit else "miss").inc()
+
+    def _from_cache(self, waveform, offset, padding, chunk_length):
+        base = self.base
+        if chunk_length is not None:
+            base.n_samples = chunk_length * base.sampling_rate
+            base.nb_max_frames = base.n_samples // base.hop_length
+
+        cache = self.cache
+        hop, half, n_fft = cache.hop, cache.half, cache.n_fft
+        length = len(waveform)
+        pad = base.n_samples if padding is True else int(padding or 0)
+        padded_length = length + pad
+        total_frames = padded_length // hop
+        if length < n_fft:
+            return None
+
+        # 帧网格按流绝对偏移对齐：帧j的中心相对waveform为 j*hop - delta
+        first_frame, delta = divmod(offset, hop)
+        # 窗口完整落在真实音频内的帧 [0, real_frames)
+        real_frames = min((length + delta - half) // hop + 1, total_frames)
+        start = real_frames * hop - delta - half
+        if start < 0:
+            return None
+        cache.wait_for(offset + length, CONFIG["feature_cache"]["feed_wait"])
+        cached = cache.get_frames(first_frame, real_frames)
+        if cached is None:
+            return None
+
+        # 末尾跨越补零区的帧：对尾部片段补零（到达末端时反射填充）后计算
+        tail_frames = total_frames - real_frames
+        parts = [cached]
+        if tail_frames > 0:
+            # 窗口完全落入补零区的帧为静音值，无需计算
+            exact_frames = min(tail_frames, (length + delta + half - 1) // hop + 1 - real_frames)
+            segment_end = min(padded_length, start + (exact_frames - 1) * hop + n_fft)
+            segment = np.zeros(segment_end - start, dtype=np.float32)
+            segment[:length - start] = waveform[start:]
+            if segment_end == padded_length:
+                segment = np.pad(segment, (0, half), mode="reflect")
+            windows = np.lib.stride_tricks.as_strided(
+                segment,
+                shape=(exact_frames, n_fft),
+                strides=(hop * segment.strides[0], segment.strides[0]),
+                writeable=False
+            )
+            parts.append(cache.log_mel(windows))
+            if tail_frames > exact_frames:
+                parts.append(np.full((cached.shape[0], tail_frames - exact_frames),
+                                     _SILENCE_LOG_MEL, dtype=np.float32))
+
+        log_spec = np.concatenate(parts, axis=1) if len(parts) > 1 else cached.copy()
+        log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
+        log_spec = (log_spec + 4.0) / 4.0
+
+        cache.stats["frames_reused"] += real_frames
+        FEATURE_FRAMES_REUSED.inc(real_frames)
+        self._record(True)
+        whisper_logger.debug(f"♻️ 特征缓存命中: 复用 {real_frames} 帧, 计算 {tail_frames} 帧")
+        return log_spec
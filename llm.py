@@ -1,44 +1,309 @@
 # 大语言模型交互模块：封装百度API调用逻辑
-# 提供API请求、缓存管理和本地备用响应功能
+# 提供API请求、缓存管理和本地备用响应功能，以及对冲请求、熔断和重试策略
 import aiohttp
-import json
+import asyncio
+import random
+import re
+import time
+from collections import OrderedDict, deque
+from typing import List, Optional
+from urllib.parse import urlparse
 from config import CONFIG
 from utils import logger
-async def ask(query: str) -> str:
-    """调用百度API"""
+from conversation import conversation_store
+from metrics import LLM_LATENCY, CACHE_REQUESTS, registry
+
+LLM_HEDGES = registry.counter("llm_hedged_requests_total", "发出的对冲请求数", ["endpoint"])
+LLM_DEGRADED = registry.counter("llm_degraded_total", "本地降级应答次数", ["reason", "source"])
+LLM_BREAKER_OPEN = registry.gauge("llm_circuit_open", "熔断器是否打开", ["endpoint"])
+
+_NORMALIZE_PATTERN = re.compile(r'[\s，。！？、,.!?~～]')
+
+# 可重试的HTTP状态码
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """单次请求失败"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def get_local_fallback_response(query: str) -> Optional[str]:
+    """无需联网即可回答的问题（时间、日期），其余返回None"""
     if not query:
-        return ""
+        return None
+    now = time.localtime()
+    if "几点" in query or "时间" in query:
+        return f"现在是{now.tm_hour}点{now.tm_min}分。"
+    if "星期几" in query or "周几" in query:
+        return f"今天是星期{'一二三四五六日'[now.tm_wday]}。"
+    if "几号" in query or "日期" in query:
+        return f"今天是{now.tm_mon}月{now.tm_mday}日。"
+    return None
+
+
+class ResponseCache:
+    """最近成功回复的缓存，熔断或请求失败时用于降级应答"""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return _NORMALIZE_PATTERN.sub("", query)
+
+    def get(self, query: str) -> Optional[str]:
+        key = self._key(query)
+        entry = self.entries.get(key)
+        if entry is None or time.time() - entry[1] > CONFIG["cache_expire"]:
+            CACHE_REQUESTS.labels("llm_reply", "miss").inc()
+            return None
+        self.entries.move_to_end(key)
+        CACHE_REQUESTS.labels("llm_reply", "hit").inc()
+        return entry[0]
+
+    def put(self, query: str, reply: str):
+        self.entries[self._key(query)] = (reply, time.time())
+        self.entries.move_to_end(self._key(query))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear_expired(self):
+        now = time.time()
+        for key in [k for k, (_, t) in self.entries.items() if now - t > CONFIG["cache_expire"]]:
+            del self.entries[key]
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断，之后每个冷却期放行一次探测请求"""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.time() - self.opened_at >= self.reset_timeout:
+            # 半开：放行本次请求，并重新计时
+            self.opened_at = time.time()
+            return True
+        return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"🔌 LLM熔断恢复: {self.name}")
+            LLM_BREAKER_OPEN.labels(self.name).set(0)
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is None and self.failures >= self.failure_threshold:
+            logger.warning(f"🔌 LLM熔断打开: {self.name} (连续失败 {self.failures} 次)")
+            LLM_BREAKER_OPEN.labels(self.name).set(1)
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.time()
 
-    logger.info("📡 请求API中...")
-    try:
-        payload = {
+
+class Endpoint:
+    """单个API地址：熔断器 + 近期延迟样本（用于计算对冲延迟）"""
+
+    def __init__(self, url: str, config: dict):
+        self.url = url
+        self.name = urlparse(url).netloc or url
+        self.breaker = CircuitBreaker(self.name, config["breaker_failures"], config["breaker_reset"])
+        self.latencies = deque(maxlen=config["latency_window"])
+
+    def hedge_delay(self, config: dict) -> float:
+        """按近期成功请求延迟的分位数决定何时发出对冲请求"""
+        if len(self.latencies) < 10:
+            delay = config["hedge_default_delay"]
+        else:
+            ordered = sorted(self.latencies)
+            delay = ordered[min(len(ordered) - 1, int(len(ordered) * config["hedge_quantile"]))]
+        return min(max(delay, config["hedge_delay_min"]), config["hedge_delay_max"])
+
+
+class LLMClient:
+    """LLM请求策略层：对冲请求、熔断、带抖动的退避重试，全部限制在总延迟预算内"""
+
+    def __init__(self):
+        self.config = CONFIG["llm"]
+        self.endpoints: List[Endpoint] = [
+            Endpoint(url, self.config) for url in [CONFIG["baidu_api_url"]] + list(self.config["endpoints"])
+        ]
+        self.cache = ResponseCache()
+        self._http: Optional[aiohttp.ClientSession] = None
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "retries": 0, "degraded": 0}
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=4)
+            )
+        return self._http
+
+    async def close(self):
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+
+    async def _request(self, endpoint: Endpoint, body: bytes) -> str:
+        async with self._session().post(
+            endpoint.url,
+            headers={
+                "Authorization": f"Bearer {CONFIG['baidu_api_key']}",
+                "Content-Type": "application/json"
+            },
+            data=body
+        ) as response:
+            if response.status != 200:
+                await response.read()
+                raise LLMError(f"状态码 {response.status}", response.status in _RETRYABLE_STATUS)
+            data = await response.json(content_type=None)
+        reply = data.get("result")
+        if not reply:
+            raise LLMError("无法解析API响应", retryable=False)
+        return reply
+
+    async def _post(self, endpoint: Endpoint, body: bytes, timeout: float) -> str:
+        """单次请求，记录分地址的延迟和结果"""
+        start_time = time.time()
+        outcome = "error"
+        try:
+            # 不用aiohttp的total超时：它会把5秒以上的超时向上取整到整秒
+            reply = await asyncio.wait_for(self._request(endpoint, body), timeout)
+            outcome = "success"
+            endpoint.latencies.append(time.time() - start_time)
+            endpoint.breaker.record_success()
+            return reply
+        except asyncio.CancelledError:
+            # 对冲请求中落败的一方，不计为失败
+            outcome = "cancelled"
+            raise
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            endpoint.breaker.record_failure()
+            raise LLMError("请求超时")
+        except (aiohttp.ClientError, ValueError) as e:
+            endpoint.breaker.record_failure()
+            raise LLMError(type(e).__name__)
+        except LLMError:
+            endpoint.breaker.record_failure()
+            raise
+        finally:
+            LLM_LATENCY.labels(endpoint.name, outcome).observe(time.time() - start_time)
+
+    async def _hedged(self, endpoints: List[Endpoint], body: bytes, timeout: float) -> str:
+        """向首选地址发请求，超过其近期p95延迟仍未返回时向备用地址（或同一地址）再发一次"""
+        primary = endpoints[0]
+        deadline = time.time() + timeout
+        first = asyncio.ensure_future(self._post(primary, body, timeout))
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=min(primary.hedge_delay(self.config), timeout))
+            remaining = deadline - time.time()
+            if not done and remaining > 0:
+                hedge = endpoints[1] if len(endpoints) > 1 else primary
+                self.stats["hedged"] += 1
+                LLM_HEDGES.labels(hedge.name).inc()
+                pending.add(asyncio.ensure_future(self._post(hedge, body, remaining)))
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _degrade(self, query: str, reason: str) -> str:
+        """本地降级：缓存的回复 → 本地规则 → 固定提示语"""
+        reply, source = self.cache.get(query), "cache"
+        if reply is None:
+            reply, source = get_local_fallback_response(query), "local"
+        if reply is None:
+            reply, source = self.config["fallback_reply"], "canned"
+        self.stats["degraded"] += 1
+        LLM_DEGRADED.labels(reason, source).inc()
+        logger.warning(f"🛟 LLM降级应答 ({reason}, 来源: {source})")
+        return reply
+
+    async def ask(self, query: str, session_id: str = "default", persona: str = None) -> str:
+        """调用百度API（携带会话历史），失败或超出预算时本地降级"""
+        if not query:
+            return ""
+
+        session = conversation_store.get(session_id)
+        fields = {
             "model": CONFIG["baidu_model"],
-            "messages": [{"role": "user", "content": query}],
             "stream": False,
             "temperature": 0.7,
             "top_p": 0.8,
             "penalty_score": 1.0
         }
+        body, tokens = session.build_payload(fields, query, persona)
+        start_time = time.time()
+        deadline = start_time + self.config["total_budget"]
+        self.stats["requests"] += 1
+        reason = "error"
+
+        logger.info("📡 请求API中...")
+        for attempt in range(CONFIG["max_retries"]):
+            endpoints = [e for e in self.endpoints if e.breaker.allow()]
+            if not endpoints:
+                return self._degrade(query, "circuit_open")
+            try:
+                reply = await self._hedged(endpoints, body, deadline - time.time())
+            except LLMError as e:
+                logger.warning(f"⚠️ LLM请求失败 (第{attempt + 1}次): {e}")
+                if not e.retryable:
+                    break
+            else:
+                duration = time.time() - start_time
+                conversation_store.record_payload(len(body), tokens, duration)
+                session.add_turn(query, reply)
+                self.cache.put(query, reply)
+                return reply
+
+            # 指数退避加抖动，避免在服务抖动时集中重试
+            backoff = min(self.config["backoff_max"], self.config["backoff_base"] * 2 ** attempt)
+            backoff *= random.uniform(0.5, 1.0)
+            if time.time() + backoff >= deadline:
+                reason = "budget"
+                break
+            self.stats["retries"] += 1
+            await asyncio.sleep(backoff)
+
+        return self._degrade(query, reason)
+
+    def print_stats(self):
+        stats = self.stats
+        logger.info(
+            f"📡 LLM请求: {stats['requests']} 次, 对冲 {stats['hedged']} 次 (胜出 {stats['hedge_wins']}), "
+            f"重试 {stats['retries']} 次, 降级 {stats['degraded']} 次"
+        )
+
+
+llm_client = LLMClient()
+
 
-        async with aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=10)
-        ) as session:
-            async with session.post(
-                CONFIG["baidu_api_url"],
-                headers={
-                    "Authorization": f"Bearer {CONFIG['baidu_api_key']}",
-                    "Content-Type": "application/json"
-                },
-                json=payload
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"❌ API错误 (状态码: {response.status})")
-                    return f"API错误: {response.status}"
-
-                data = await response.json()
-                return data.get("result", "无法解析API响应")
-
-    except Exception as e:
-        logger.error(f"❌ 请求失败: {type(e).__name__}")
-        return "服务异常"
+async def ask(query: str, session_id: str = "default", persona: str = None) -> str:
+    return await llm_client.ask(query, session_id, persona)
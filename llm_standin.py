@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# LLM替身服务：在本地模拟千帆接口，按比例注入延迟和错误
+# 用法: python llm_standin.py --slow-rate 0.2 --slow-delay 8 --error-rate 0.1 --drive 50
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import CONFIG
+from utils import logger
+
+
+class _StandinHandler(BaseHTTPRequestHandler):
+    # 由make_server设置
+    options = None
+
+    def do_POST(self):
+        options = self.options
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        down = options.down_after is not None and time.time() - options.started > options.down_after
+        if down or random.random() < options.error_rate:
+            self.send_error(503)
+            return
+        delay = options.delay
+        if random.random() < options.slow_rate:
+            delay = options.slow_delay
+        time.sleep(delay * random.uniform(0.8, 1.2))
+
+        query = body.get("messages", [{}])[-1].get("content", "")
+        reply = json.dumps({"result": f"收到：{query}"}, ensure_ascii=False).encode("utf-8")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(reply)))
+            self.end_headers()
+            self.wfile.write(reply)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端已取消（对冲请求落败）
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host: str, port: int, options) -> ThreadingHTTPServer:
+    options.started = time.time()
+    handler = type("StandinHandler", (_StandinHandler,), {"options": options})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+async def drive(count: int):
+    """用真实的LLMClient连续请求替身服务，统计单轮延迟分布"""
+    from llm import LLMClient
+    client = LLMClient()
+    latencies = []
+    try:
+        for i in range(count):
+            start = time.perf_counter()
+            await client.ask(f"测试问题{i}", session_id=f"standin-{i}")
+            latencies.append(time.perf_counter() - start)
+    finally:
+        await client.close()
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+    print(f"请求 {count} 次: p50 {pick(0.5):.2f}s, p95 {pick(0.95):.2f}s, 最大 {latencies[-1]:.2f}s")
+    client.print_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8399)
+    parser.add_argument("--delay", type=float, default=0.3, help="正常响应延迟（秒）")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="慢响应比例")
+    parser.add_argument("--slow-delay", type=float, default=8.0, help="慢响应延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回503的比例")
+    parser.add_argument("--down-after", type=float, help="启动多少秒后全部返回503")
+    parser.add_argument("--drive", type=int, metavar="N", help="启动后用LLMClient请求N次并输出延迟统计")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args)
+    url = f"http://{args.host}:{args.port}/v2/chat/completions"
+    logger.info(f"🧪 LLM替身服务: {url}")
+    if args.drive is None:
+        server.serve_forever()
+        return
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    CONFIG["baidu_api_url"] = url
+    CONFIG["llm"]["endpoints"] = []
+    asyncio.run(drive(args.drive))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
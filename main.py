@@ -8,21 +8,9 @@ from utils import logger
 import sounddevice as sd
 import numpy as np
 from stt import load_model, transcribe  # ← 新增
-from llm import ask
-from tts import speak
+from llm import ask, llm_client
 from utils import MemoryManager, AudioBufferCleaner, WhisperModelCleaner
 from wakeword import WakeWordDetector
-import os
-import resource
-import sounddevice as sd
-from faster_whisper import WhisperModel
-from .audio import AudioManager
-from .wakeword import WakeWordDetector
-from .stt import WhisperOptimizer
-from .utils import (
-    MemoryManager, AudioBufferCleaner, WhisperModelCleaner, TTSCleaner,
-    structured_logger, cache_manager, state
-)
 
 class VoiceAssistant:
     _http_session = None
@@ -54,24 +42,22 @@ class VoiceAssistant:
         return audio
 
     async def run(self):
-        """主运行循环"""
+        """单轮运行：录音后交给识别→回复→合成→播放流水线"""
+        pipeline = Pipeline(
+            build_response_stages(lambda audio, offset: transcribe(audio), ask),
+            name="voice_assistant"
+        )
         try:
             audio = self.record_audio()
             if audio is None:
                 return
-            query = transcribe(audio)  # ← 直接调用 stt.py 函数
-            if not query:
-                logger.warning("⚠️ 未识别到有效输入")
-                return
-            logger.info(f"👂 识别结果: {query}")
-            reply = await ask(query)
-            logger.info(f"🤖 百度回复: {reply}")
-            raw = await speak(reply)
-            from audio import play
-            play(raw)
+            pipeline.start()
+            await pipeline.process(pipeline.new_turn(audio=audio))
         except Exception as e:
             logger.error(f"💥 系统错误: {e}")
         finally:
+            await pipeline.stop()
+            await llm_client.close()
             if VoiceAssistant._http_session:
                 import aiohttp
                 await VoiceAssistant._http_session.close()
@@ -81,129 +67,251 @@ class VoiceAssistant:
 # 修复导入错误和重复导入
 import asyncio
 import os
+import time
 from pathlib import Path
 import numpy as np
 import sounddevice as sd
-from faster_whisper import WhisperModel
 from config import CONFIG
-from audio import AudioManager
+from audio import AudioManager, audio_session
+from audio_process import ProcessAudioManager
 from wakeword import WakeWordDetector
-from stt import WhisperOptimizer
-from tts import text_to_speech
-from llm import call_baidu_api_optimized, get_local_fallback_response
+from stt import WhisperOptimizer, load_model, print_startup_profile
+from tts import stream_blocks, play_blocks
+from pipeline import Pipeline, Stage
+from llm import llm_client, get_local_fallback_response
+from conversation import conversation_store
+from archive import AudioArchive
+from devices import AudioDeviceManager
+from metrics import start_metrics_export
+from profiling import setup_profiling, print_stage_stats
 from utils import (
-    logger, structured_logger, state, cache_manager,
-    MemoryManager, AudioBufferCleaner, WhisperModelCleaner, TTSCleaner
+    logger, structured_logger, state,
+    MemoryManager, AudioBufferCleaner, WhisperModelCleaner
 )
+from tts import TTSCleaner
+
+def pipeline_stage(name, handler):
+    """按CONFIG["pipeline"]中的并发、队列和超时配置创建阶段"""
+    options = dict(CONFIG["pipeline"]["stages"][name])
+    if name == "stt" and CONFIG["stt_batch"]["enabled"]:
+        # 单并发时同一时刻只有一条话语在识别，批量调度器凑不出批次
+        options["concurrency"] = max(options["concurrency"], CONFIG["stt_batch"]["max_batch_size"])
+    return Stage(name, handler, **options)
+
+
+def build_response_stages(transcribe_fn, respond_fn, archive=None):
+    """识别→回复→合成→播放四个阶段，main()和VoiceAssistant.run共用"""
+
+    async def stt_stage(ctx):
+        audio = ctx.data.pop("audio")
+        query = await asyncio.to_thread(transcribe_fn, audio, ctx.data.get("offset"))
+        if archive is not None:
+            archive.submit(ctx.turn_id, audio, ctx.data.get("wake_score"), query)
+        if not query:
+            logger.warning("⚠️ 未识别到语音")
+            return None
+        logger.info(f"🗣️ 识别结果: {query}")
+        ctx.data["query"] = query
+        return ctx
+
+    async def llm_stage(ctx):
+        profile = ctx.data.get("profile") or {}
+        response = await respond_fn(ctx.data["query"], profile.get("session_id", "default"), profile.get("persona"))
+        if not response:
+            return None
+        logger.info(f"🤖 回复: {response[:50]}...")
+        ctx.data["response"] = response
+        return ctx
+
+    async def tts_stage(ctx):
+        """启动流式合成，首块音频就绪即交给播放阶段，其余块在后台继续合成"""
+        blocks = asyncio.Queue(maxsize=CONFIG["pipeline"]["tts_buffer_blocks"])
+
+        async def produce():
+            try:
+                voice = (ctx.data.get("profile") or {}).get("voice")
+                async for block in stream_blocks(ctx.data["response"], voice):
+                    await blocks.put(block)
+            except Exception as e:
+                logger.error(f"❌ TTS失败: {e}")
+            await blocks.put(None)
+
+        ctx.spawn(produce())
+        first = await blocks.get()
+        if first is None:
+            return None
+
+        async def pcm_blocks():
+            block = first
+            while block is not None:
+                yield block
+                block = await blocks.get()
+
+        ctx.data["pcm_blocks"] = pcm_blocks()
+        return ctx
+
+    async def playback_stage(ctx):
+        await play_blocks(ctx.data.pop("pcm_blocks"))
+        return ctx
+
+    return [
+        pipeline_stage("stt", stt_stage),
+        pipeline_stage("llm", llm_stage),
+        pipeline_stage("tts", tts_stage),
+        pipeline_stage("playback", playback_stage),
+    ]
 
-# 移除未使用的VoiceAssistant类定义
 
 async def main():
-    ""主循环""
+    """主循环"""
     logger.info("🚀 语音助手启动")
     logger.info(f"📋 唤醒词: {', '.join(CONFIG['wake_words'])}")
     
+    start_metrics_export()
+    setup_profiling()
+    
     # 初始化组件
-    model = initialize_models()
-    device_id = initialize_audio()
-    audio_manager = AudioManager(device_id, CONFIG["sample_rate"], CONFIG["audio_chunk_size"])
+    device_manager = AudioDeviceManager()
+    device_manager.start()  # 设备探测与模型加载并行
     wake_detector = WakeWordDetector()
-    whisper_optimizer = WhisperOptimizer(model)
+    # 不在这里保留模型引用，否则内存清理卸载模型时无法真正释放
+    whisper_optimizer = WhisperOptimizer(initialize_models(), wake_detector)
+    device_id = initialize_audio(device_manager)
+    if CONFIG["audio_capture"]["mode"] == "process":
+        audio_manager = ProcessAudioManager(device_id, CONFIG["sample_rate"], CONFIG["audio_chunk_size"])
+    else:
+        audio_manager = AudioManager(device_id, CONFIG["sample_rate"], CONFIG["audio_chunk_size"])
+    if whisper_optimizer.feature_cache is not None:
+        # 采集块在后台逐块计算log-mel，对话解码时直接取用
+        audio_manager.add_listener(whisper_optimizer.feature_cache.feed)
     memory_manager = MemoryManager()
+    archive = AudioArchive() if CONFIG["audio_archive"]["enabled"] else None
     
     # 初始化清理器
     audio_cleaner = AudioBufferCleaner(audio_manager)
     whisper_cleaner = WhisperModelCleaner(whisper_optimizer)
     tts_cleaner = TTSCleaner()
     
-    # 注册清理回调
-    memory_manager.add_cleanup_callback(audio_cleaner.cleanup)
-    memory_manager.add_cleanup_callback(whisper_cleaner.cleanup)
-    memory_manager.add_cleanup_callback(tts_cleaner.cleanup)
-    memory_manager.add_cleanup_callback(cache_manager.clear_expired)
+    # 注册分级清理回调
+    memory_manager.add_cleanup_callback(audio_cleaner.cleanup, "cache")
+    memory_manager.add_cleanup_callback(whisper_cleaner.cleanup, "cache")
+    memory_manager.add_cleanup_callback(tts_cleaner.cleanup, "cache")
+    memory_manager.add_cleanup_callback(conversation_store.clear_expired, "cache")
+    memory_manager.add_cleanup_callback(llm_client.cache.clear_expired, "cache")
+    memory_manager.add_cleanup_callback(whisper_optimizer.release_model, "model")
+    if archive is not None:
+        memory_manager.add_cleanup_callback(archive.prune, "cache")
+        archive.start()
+    memory_manager.start()
     
-    try:
-        # 添加缺失的HTTP会话初始化
-        await initialize_http_session()
+    # 麦克风同一时间只能有一路录音：监听窗口与对话录音互斥，对话录音可抢占监听窗口
+    mic = asyncio.Lock()
+    mic_wanted = asyncio.Event()
+    engaged = set()
+    
+    def finish_turn(ctx):
+        """已唤醒的轮次结束（完成、失败或被取消）"""
+        engaged.discard(ctx.turn_id)
+        if "query" in ctx.data:
+            whisper_optimizer.print_performance_stats()
+            conversation_store.print_stats()
+            llm_client.print_stats()
+            wake_detector.print_inference_stats()
+        # 清理由内存监控在空闲期调度
+        if not engaged:
+            memory_manager.mark_idle()
+        state.conversation_count += 1
+    
+    async def capture_source(pipeline):
+        """采集：按监听窗口录音送入唤醒阶段，唤醒队列满时在此等待（背压）"""
+        logger.info("👂 监听唤醒词...")
+        while True:
+            async with mic:
+                audio_manager.start_recording()
+                try:
+                    await asyncio.wait_for(mic_wanted.wait(), CONFIG["listen_duration"])
+                except asyncio.TimeoutError:
+                    pass
+                audio = audio_manager.stop_recording()
+                preempted = mic_wanted.is_set()
+            if audio is None or preempted:
+                await asyncio.sleep(0)
+                continue
+            await pipeline.submit(pipeline.new_turn(audio=audio, offset=audio_manager.last_recording_offset))
+    
+    async def wake_stage(ctx):
+        event, score = await asyncio.to_thread(wake_detector.detect_event, ctx.data.pop("audio"), ctx.data.get("offset"))
+        if event is None:
+            logger.debug(f"未检测到唤醒词 (置信度: {score:.2f})")
+            return None
         
+        logger.info(f"🎯 检测到唤醒词: {event.word} (置信度: {score:.2f})")
+        ctx.data.update(wake_score=score, wake_word=event.word, profile=event.profile)
+        if CONFIG["pipeline"]["barge_in"]:
+            ctx.pipeline.cancel_active("唤醒打断", exclude=ctx, after_stage="wake")
+        # 清理正在执行时等待其完成，之后直到本轮结束都不会开始新的清理
+        await asyncio.to_thread(memory_manager.mark_busy)
+        # 模型被内存清理卸载过时，趁用户说话录音期间在后台重新加载
+        whisper_optimizer.preload_model_async()
+        engaged.add(ctx.turn_id)
+        ctx.done.add_done_callback(lambda _: finish_turn(ctx))
+        return ctx
+    
+    async def endpoint_stage(ctx):
+        logger.info("💬 进入对话模式...")
+        mic_wanted.set()
+        async with mic:
+            mic_wanted.clear()
+            audio = await asyncio.to_thread(
+                audio_manager.record_until_silence,
+                CONFIG["silence_duration"],
+                CONFIG["max_conversation_time"]
+            )
+            offset = audio_manager.last_recording_offset
+        if audio is None:
+            logger.warning("⚠️ 对话录音失败")
+            return None
+        ctx.data.update(audio=audio, offset=offset)
+        return ctx
+    
+    async def respond(query, session_id="default", persona=None):
+        # 本地备用响应检查
+        response = get_local_fallback_response(query)
+        if not response:
+            # 调用LLM（失败或超出延迟预算时降级应答）
+            response = await llm_client.ask(query, session_id, persona)
+        return response
+    
+    pipeline = Pipeline(
+        [pipeline_stage("wake", wake_stage), pipeline_stage("endpoint", endpoint_stage)]
+        + build_response_stages(whisper_optimizer.transcribe_conversation_optimized, respond, archive),
+        name="assistant"
+    )
+    
+    try:
         with audio_session(audio_manager):
-            while True:
-                # 监听唤醒词
-                logger.info("👂 监听唤醒词...")
-                audio = audio_manager.record_for_duration(CONFIG["listen_duration"])
-                
-                if audio is None:
-                    continue
-                
-                # 检测唤醒词
-                is_wake_word, score = wake_detector.detect(audio)
-                if not is_wake_word:
-                    logger.debug(f"未检测到唤醒词 (置信度: {score:.2f})")
-                    continue
-                
-                logger.info(f"🎯 检测到唤醒词 (置信度: {score:.2f})")
-                
-                # 对话阶段
-                logger.info("💬 进入对话模式...")
-                audio = audio_manager.record_until_silence(
-                    CONFIG["silence_duration"],
-                    CONFIG["max_conversation_time"]
-                )
-                
-                if audio is None:
-                    logger.warning("⚠️ 对话录音失败")
-                    continue
-                
-                query = whisper_optimizer.transcribe_conversation_optimized(audio)
-                if not query:
-                    logger.warning("⚠️ 未识别到语音")
-                    continue
-                
-                logger.info(f"🗣️ 识别结果: {query}")
-                
-                # 本地备用响应检查
-                response = get_local_fallback_response(query)
-                if not response:
-                    # 调用LLM
-                    response = await call_baidu_api_optimized(query)
-                
-                if response:
-                    logger.info(f"🤖 回复: {response[:50]}...")
-                    await text_to_speech(response)
-                
-                # 性能统计
-                whisper_optimizer.print_performance_stats()
-                
-                # 定期清理
-                if state.conversation_count % CONFIG["cleanup_interval"] == 0:
-                    memory_manager.force_cleanup("定期清理")
-                
-                state.conversation_count += 1
-                await asyncio.sleep(0.5)
+            # 采集流停滞或设备拔出时在后台切换设备并重开流
+            device_manager.watch(audio_manager)
+            await pipeline.run(capture_source)
                 
     except KeyboardInterrupt:
         logger.info("👋 用户中断，退出程序")
     except Exception as e:
         logger.error(f"主循环错误: {e}", exc_info=True)
     finally:
+        device_manager.stop()
+        memory_manager.stop()
+        memory_manager.print_stats()
+        print_stage_stats()
         memory_manager.force_cleanup("程序退出清理")
-        await close_http_session()
+        await llm_client.close()
+        if archive is not None:
+            archive.stop()
         logger.info("👋 语音助手已退出")
 
-    logger.info(f"👂 识别结果: {query}")
-    reply = await ask(query)
-    logger.info(f"🤖 百度回复: {reply}")
-    raw = await speak(reply)
-    from audio import play
-    play(raw)
-
-    await VoiceAssistant._http_session.close()
-
-    logger.info("🌐 HTTP会话已关闭")
-
 # 添加模型和音频初始化函数
 def initialize_models():
-    ""针对硬件优化的模型初始化""
+    """针对硬件优化的模型初始化"""
     structured_logger.log_operation("Whisper模型初始化", "开始")
     
     try:
@@ -211,14 +319,9 @@ def initialize_models():
         os.environ['OMP_NUM_THREADS'] = '2'
         os.environ['MKL_NUM_THREADS'] = '2'
         
-        model = WhisperModel(
-            model_size_or_path=CONFIG["model_path"],
-            device="cpu",
-            compute_type=CONFIG["compute_type"],
-            local_files_only=True,
-            cpu_threads=2,
-            num_workers=1
-        )
+        # 与stt.load_model共用同一份全局模型，启动时加载并预热；卸载后的重新加载不预热
+        model = load_model()
+        print_startup_profile()
         structured_logger.log_success("Whisper模型初始化完成")
         return model
     except Exception as e:
@@ -226,29 +329,12 @@ def initialize_models():
         raise
 
 
-def initialize_audio():
-    ""音频设备初始化""
+def initialize_audio(device_manager):
+    """音频设备初始化：设备列表在后台线程探测，这里只取探测结果"""
     structured_logger.log_operation("音频设备初始化", "开始")
     
     try:
-        # 重置音频子系统
-        sd._terminate()
-        sd._initialize()
-        
-        devices = sd.query_devices()
-        usb_devices = [i for i, device in enumerate(devices) if device['max_input_channels'] > 0 and 'USB' in str(device).upper()]
-        
-        if usb_devices:
-            device_id = usb_devices[0]
-            audio_logger.info(f"使用USB音频设备: {device_id}")
-        else:
-            device_id = sd.default.device[0]
-            audio_logger.info(f"使用默认音频设备: {device_id}")
-        
-        # 测试音频设备
-        with sd.InputStream(samplerate=CONFIG["sample_rate"], channels=1, device=device_id):
-            pass
-        
+        device_id = device_manager.select_device()
         structured_logger.log_success("音频设备初始化完成")
         return device_id
     except Exception as e:
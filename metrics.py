@@ -0,0 +1,266 @@
+# 指标模块：轻量级计数器/仪表/直方图注册表
+# 以Prometheus文本格式通过本地HTTP端口暴露，可选写入textfile-collector目录
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Sequence, Tuple
+from config import CONFIG
+from utils import system_logger
+
+METRIC_PREFIX = "voice_assistant_"
+
+# 默认延迟分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 实时率分桶（处理耗时/音频时长）
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 4.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def sync(self, total: float):
+        """同步外部维护的累计值（如子进程共享内存中的计数）"""
+        self.value = float(total)
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """抓取时才计算的值（如RSS），热路径无开销"""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return float("nan")
+        return self.value
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _MetricFamily:
+    """指标族：无标签时直接调用inc/set/observe，有标签时通过labels()取子指标"""
+
+    def __init__(self, kind: str, name: str, documentation: str,
+                 labelnames: Sequence[str] = (), buckets: Tuple[float, ...] = None):
+        self.kind = kind
+        self.name = METRIC_PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if buckets else None
+        self.children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        self._default = None if self.labelnames else self._new_child()
+        if self._default is not None:
+            self.children[()] = self._default
+            # 无标签指标直接绑定子指标的方法，避免每次调用的属性查找
+            for method in ("inc", "dec", "set", "sync", "observe", "set_function"):
+                if hasattr(self._default, method):
+                    setattr(self, method, getattr(self._default, method))
+
+    def _new_child(self):
+        if self.kind == "counter":
+            return _CounterChild()
+        if self.kind == "gauge":
+            return _GaugeChild()
+        return _HistogramChild(self.buckets or LATENCY_BUCKETS)
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            with self._lock:
+                child = self.children.get(values)
+                if child is None:
+                    if len(values) != len(self.labelnames):
+                        raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+                    child = self._new_child()
+                    self.children[values] = child
+        return child
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in list(self.children.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values))
+            if self.kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(child.buckets, child.counts):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{{{labels + ',' if labels else ''}{le}}} {cumulative}")
+                cumulative += child.counts[-1]
+                lines.append(f"{self.name}_bucket{{{labels + ',' if labels else ''}le=\"+Inf\"}} {cumulative}")
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{self.name}_sum{suffix} {child.sum}")
+                lines.append(f"{self.name}_count{suffix} {child.count}")
+            else:
+                value = child.get() if self.kind == "gauge" else child.value
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{self.name}{suffix} {value}")
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self.families: Dict[str, _MetricFamily] = {}
+        self.collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, kind, name, documentation, labelnames=(), buckets=None):
+        with self._lock:
+            family = self.families.get(name)
+            if family is None:
+                family = _MetricFamily(kind, name, documentation, labelnames, buckets)
+                self.families[name] = family
+            return family
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        return self._register("counter", name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        return self._register("gauge", name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        return self._register("histogram", name, documentation, labelnames, buckets)
+
+    def add_collector(self, collector: Callable[[], None]):
+        """注册抓取前调用的同步函数，用于从外部状态刷新指标"""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in list(self.collectors):
+            try:
+                collector()
+            except Exception as e:
+                system_logger.debug(f"指标收集失败: {e}")
+        lines = []
+        for family in list(self.families.values()):
+            family.render(lines)
+        lines.append("")
+        return "\n".join(lines)
+
+
+registry = MetricsRegistry()
+
+
+def _rss_bytes() -> float:
+    import psutil
+    return psutil.Process().memory_info().rss
+
+
+# 预定义指标
+PROCESS_RSS = registry.gauge("process_rss_bytes", "进程常驻内存")
+PROCESS_RSS.set_function(_rss_bytes)
+CLEANUP_RUNS = registry.counter("memory_cleanup_runs_total", "内存清理次数（按清理级别）", ["tier"])
+CLEANUP_FREED = registry.counter("memory_cleanup_freed_megabytes_total", "内存清理释放的RSS总量(MB)")
+WAKE_FRAMES_INFERRED = registry.counter("wake_frames_inferred_total", "唤醒模型推理帧数")
+WAKE_FRAMES_GATED = registry.counter("wake_frames_gated_total", "未送入唤醒模型推理的帧数")
+STT_RTF = registry.histogram("stt_real_time_factor", "语音识别实时率(耗时/音频时长)", ["call_type"], RTF_BUCKETS)
+LLM_LATENCY = registry.histogram("llm_latency_seconds", "LLM单次请求耗时", ["endpoint", "outcome"])
+TTS_LATENCY = registry.histogram("tts_latency_seconds", "语音合成耗时")
+TTS_FIRST_AUDIO = registry.histogram("tts_first_audio_seconds", "语音合成首块PCM产出耗时")
+CACHE_REQUESTS = registry.counter("cache_requests_total", "缓存查询次数", ["cache", "result"])
+AUDIO_XRUNS = registry.counter("audio_xruns_total", "音频回调状态异常次数", ["source"])
+AUDIO_OVERFLOWS = registry.counter("audio_input_overflows_total", "音频输入溢出次数", ["source"])
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host: str, port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    system_logger.info(f"📈 指标服务已启动: http://{host}:{port}/metrics")
+    return server
+
+
+def write_textfile(path: str):
+    """原子写入textfile-collector文件"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+def _textfile_loop(path: str, interval: float):
+    while True:
+        try:
+            write_textfile(path)
+        except Exception as e:
+            system_logger.error(f"❌ 指标文件写入失败: {e}")
+        time.sleep(interval)
+
+
+def start_metrics_export():
+    """按配置启动HTTP指标服务和textfile写入"""
+    config = CONFIG["metrics"]
+    if not config["enabled"]:
+        return
+    if config["port"]:
+        start_metrics_server(config["host"], config["port"])
+    if config["textfile_path"]:
+        threading.Thread(
+            target=_textfile_loop,
+            args=(config["textfile_path"], config["textfile_interval"]),
+            name="metrics-textfile",
+            daemon=True
+        ).start()
+        system_logger.info(f"📈 指标文件: {config['textfile_path']}")
@@ -0,0 +1,198 @@
+# 流水线调度模块：以有界异步队列连接各处理阶段
+# 提供阶段并发限制、队列背压、超时/打断时的取消传播和队列深度指标
+import asyncio
+import itertools
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from utils import logger
+from metrics import registry, LATENCY_BUCKETS
+
+PIPELINE_QUEUE_DEPTH = registry.gauge("pipeline_queue_depth", "阶段输入队列深度", ["stage"])
+PIPELINE_IN_FLIGHT = registry.gauge("pipeline_in_flight", "阶段正在处理的轮次数", ["stage"])
+PIPELINE_STAGE_LATENCY = registry.histogram(
+    "pipeline_stage_seconds", "阶段处理耗时", ["stage"], LATENCY_BUCKETS + (30.0, 60.0)
+)
+PIPELINE_CANCELLED = registry.counter("pipeline_cancelled_total", "被取消的轮次数", ["stage"])
+
+_turn_ids = itertools.count(1)
+
+
+class TurnContext:
+    """一轮对话在各阶段间传递的上下文"""
+
+    def __init__(self, **data):
+        self.turn_id = next(_turn_ids)
+        self.data = data
+        self.created = time.time()
+        self.stage: Optional[str] = None
+        self.cancel_reason: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.pipeline: Optional["Pipeline"] = None
+        self._children: List[asyncio.Task] = []
+        self.done = asyncio.get_running_loop().create_future()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_reason is not None
+
+    def cancel(self, reason: str):
+        """取消本轮：正在执行的阶段任务被中断，后续阶段不再处理"""
+        if self.done.done() or self.cancelled:
+            return
+        self.cancel_reason = reason
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+        self._cancel_children()
+
+    def spawn(self, coro) -> asyncio.Task:
+        """启动跨阶段的后台任务（如流式合成），随本轮结束或取消一起取消"""
+        task = asyncio.ensure_future(coro)
+        self._children.append(task)
+        return task
+
+    def _cancel_children(self):
+        for task in self._children:
+            if not task.done():
+                task.cancel()
+        self._children.clear()
+
+    def finish(self):
+        self._cancel_children()
+        if not self.done.done():
+            self.done.set_result(self)
+
+
+# 阶段处理函数：返回上下文则交给下一阶段，返回None则本轮结束
+StageHandler = Callable[[TurnContext], Awaitable[Optional[TurnContext]]]
+
+
+class Stage:
+    """流水线阶段：有界输入队列 + 固定数量的工作协程"""
+
+    def __init__(self, name: str, handler: StageHandler, concurrency: int = 1,
+                 queue_size: int = 1, timeout: Optional[float] = None):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.queue: Optional[asyncio.Queue] = None
+        self.in_flight = 0
+
+
+class Pipeline:
+    """按顺序连接的阶段流水线，各阶段独立并发，下游满时上游阻塞（背压）"""
+
+    def __init__(self, stages: List[Stage], name: str = "pipeline"):
+        self.name = name
+        self.stages = stages
+        self.stage_index: Dict[str, int] = {stage.name: i for i, stage in enumerate(stages)}
+        self.active: Dict[int, TurnContext] = {}
+        self._workers: List[asyncio.Task] = []
+
+        for stage in stages:
+            PIPELINE_QUEUE_DEPTH.labels(stage.name).set_function(
+                lambda stage=stage: stage.queue.qsize() if stage.queue else 0
+            )
+            PIPELINE_IN_FLIGHT.labels(stage.name).set_function(lambda stage=stage: stage.in_flight)
+
+    def new_turn(self, **data) -> TurnContext:
+        ctx = TurnContext(**data)
+        ctx.pipeline = self
+        self.active[ctx.turn_id] = ctx
+        ctx.done.add_done_callback(lambda _: self.active.pop(ctx.turn_id, None))
+        return ctx
+
+    async def submit(self, ctx: TurnContext, stage_name: Optional[str] = None):
+        """送入指定阶段（默认第一阶段），队列满时等待"""
+        stage = self.stages[self.stage_index[stage_name]] if stage_name else self.stages[0]
+        await stage.queue.put(ctx)
+
+    async def process(self, ctx: TurnContext, stage_name: Optional[str] = None) -> TurnContext:
+        """送入并等待本轮结束"""
+        await self.submit(ctx, stage_name)
+        return await ctx.done
+
+    def cancel_active(self, reason: str, exclude: Optional[TurnContext] = None,
+                      after_stage: Optional[str] = None):
+        """取消在途轮次（例如打断）；after_stage限定只取消已越过该阶段的轮次"""
+        min_index = self.stage_index[after_stage] + 1 if after_stage else 0
+        for ctx in list(self.active.values()):
+            if ctx is exclude or ctx.stage is None:
+                continue
+            if self.stage_index.get(ctx.stage, -1) >= min_index:
+                logger.info(f"⛔ 取消第 {ctx.turn_id} 轮 ({ctx.stage}): {reason}")
+                ctx.cancel(reason)
+
+    def start(self):
+        if self._workers:
+            return
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(maxsize=stage.queue_size)
+        for index, stage in enumerate(self.stages):
+            for worker_id in range(stage.concurrency):
+                self._workers.append(asyncio.create_task(
+                    self._worker(index, stage), name=f"{self.name}-{stage.name}-{worker_id}"
+                ))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        for ctx in list(self.active.values()):
+            ctx.cancel("流水线停止")
+            ctx.finish()
+
+    async def run(self, source: Optional[Callable[["Pipeline"], Awaitable[None]]] = None):
+        """启动各阶段并运行数据源协程，数据源结束或被取消时停止流水线"""
+        self.start()
+        try:
+            if source is not None:
+                await source(self)
+        finally:
+            await self.stop()
+
+    async def _worker(self, index: int, stage: Stage):
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            ctx = await stage.queue.get()
+            try:
+                result = await self._run_stage(stage, ctx)
+                if result is None or ctx.cancelled or next_stage is None:
+                    ctx.finish()
+                else:
+                    await next_stage.queue.put(result)
+            finally:
+                stage.queue.task_done()
+
+    async def _run_stage(self, stage: Stage, ctx: TurnContext) -> Optional[TurnContext]:
+        if ctx.cancelled:
+            return None
+        ctx.stage = stage.name
+        ctx.task = asyncio.ensure_future(stage.handler(ctx))
+        stage.in_flight += 1
+        start_time = time.time()
+        try:
+            if stage.timeout:
+                return await asyncio.wait_for(ctx.task, stage.timeout)
+            return await ctx.task
+        except asyncio.TimeoutError:
+            ctx.cancel(f"{stage.name}超时")
+            logger.warning(f"⏰ 第 {ctx.turn_id} 轮在 {stage.name} 阶段超时 ({stage.timeout}s)")
+            PIPELINE_CANCELLED.labels(stage.name).inc()
+            return None
+        except asyncio.CancelledError:
+            if not ctx.cancelled:
+                # 工作协程本身被取消（流水线停止）
+                ctx.task.cancel()
+                raise
+            PIPELINE_CANCELLED.labels(stage.name).inc()
+            return None
+        except Exception as e:
+            logger.error(f"❌ 第 {ctx.turn_id} 轮在 {stage.name} 阶段失败: {e}")
+            return None
+        finally:
+            stage.in_flight -= 1
+            ctx.task = None
+            PIPELINE_STAGE_LATENCY.labels(stage.name).observe(time.time() - start_time)
@@ -0,0 +1,184 @@
+# 性能剖析模块：按阶段统计线程CPU时间，按需采集有时限的采样剖析（折叠栈，可直接生成火焰图）
+# 通过信号或配置开启；关闭时各阶段包装器只多一次标志判断
+import functools
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+from config import CONFIG
+from utils import system_logger
+from metrics import registry
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不统计子进程CPU
+    resource = None
+
+PROFILE_STAGE_CPU = registry.counter("profile_stage_cpu_seconds_total", "剖析期间各阶段的线程CPU时间", ["stage"])
+PROFILE_STAGE_WALL = registry.counter("profile_stage_wall_seconds_total", "剖析期间各阶段的墙钟时间", ["stage"])
+PROFILE_STAGE_CALLS = registry.counter("profile_stage_calls_total", "剖析期间各阶段的调用次数", ["stage"])
+
+_enabled = False
+_lock = threading.Lock()
+# {阶段: [调用次数, 线程CPU秒, 墙钟秒, 子进程CPU秒]}
+_stage_stats: Dict[str, list] = {}
+
+
+def _children_cpu() -> float:
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _record(stage: str, cpu: float, wall: float, child_cpu: float):
+    with _lock:
+        stats = _stage_stats.setdefault(stage, [0, 0.0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += cpu
+        stats[2] += wall
+        stats[3] += child_cpu
+    PROFILE_STAGE_CALLS.labels(stage).inc()
+    PROFILE_STAGE_CPU.labels(stage).inc(cpu)
+    PROFILE_STAGE_WALL.labels(stage).inc(wall)
+
+
+def profiled(stage: str):
+    """阶段计时装饰器：记录调用线程的CPU时间、墙钟时间和等待到的子进程CPU（如ffmpeg）"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            cpu_start = time.thread_time()
+            wall_start = time.perf_counter()
+            child_start = _children_cpu()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _record(stage, time.thread_time() - cpu_start,
+                        time.perf_counter() - wall_start, _children_cpu() - child_start)
+        return wrapper
+    return decorator
+
+
+def set_accounting(enabled: bool):
+    global _enabled
+    _enabled = enabled
+
+
+def get_stage_stats() -> Dict[str, dict]:
+    with _lock:
+        return {
+            stage: {"calls": calls, "cpu": cpu, "wall": wall, "child_cpu": child_cpu}
+            for stage, (calls, cpu, wall, child_cpu) in _stage_stats.items()
+        }
+
+
+def reset_stage_stats():
+    with _lock:
+        _stage_stats.clear()
+
+
+def print_stage_stats():
+    stats = get_stage_stats()
+    if not stats:
+        return
+    system_logger.info("🔬 阶段CPU统计 (线程CPU / 墙钟 / 子进程CPU):")
+    for stage, s in sorted(stats.items(), key=lambda item: -item[1]["cpu"]):
+        busy = s["cpu"] / s["wall"] * 100 if s["wall"] else 0.0
+        system_logger.info(
+            f"   {stage:<16} {s['calls']:>6} 次  CPU {s['cpu'] * 1000:9.1f}ms  "
+            f"墙钟 {s['wall'] * 1000:9.1f}ms ({busy:5.1f}%)  子进程 {s['child_cpu'] * 1000:8.1f}ms"
+        )
+
+
+class SamplingProfiler:
+    """有时限的采样剖析：定时抓取所有线程的调用栈，输出折叠栈（flamegraph.pl / speedscope格式）"""
+
+    def __init__(self):
+        self.config = CONFIG["profiling"]
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float = None) -> bool:
+        if self.running:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(duration or self.config["duration"],),
+            name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, duration: float):
+        interval = self.config["interval"]
+        own_ident = threading.get_ident()
+        counts = Counter()
+        samples = 0
+        reset_stage_stats()
+        set_accounting(True)
+        system_logger.info(f"🔬 开始采样剖析: {duration:.0f}秒, 间隔 {interval * 1000:.1f}ms")
+
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline and not self._stop.is_set():
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                counts[";".join(reversed(stack))] += 1
+            samples += 1
+            time.sleep(interval)
+
+        set_accounting(self.config["enabled"])
+        path = self._write(counts)
+        system_logger.info(f"🔬 采样剖析完成: {samples} 次采样 → {path}")
+        print_stage_stats()
+
+    def _write(self, counts: Counter) -> str:
+        os.makedirs(self.config["output_dir"], exist_ok=True)
+        path = os.path.join(self.config["output_dir"], f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+profiler = SamplingProfiler()
+
+
+def toggle_profiling(*_):
+    """信号处理：未在剖析时开始一次采样剖析，正在剖析时提前结束"""
+    if profiler.running:
+        profiler.stop()
+    else:
+        profiler.start()
+
+
+def setup_profiling():
+    """按配置开启阶段统计，并注册剖析开关信号（需在主线程调用）"""
+    config = CONFIG["profiling"]
+    set_accounting(config["enabled"])
+    signal_number = getattr(signal, config["signal"], None)
+    if signal_number is not None:
+        signal.signal(signal_number, toggle_profiling)
+        system_logger.info(f"🔬 发送 {config['signal']} 开始/结束采样剖析 (kill -{config['signal'][3:]} {os.getpid()})")
+    if config["enabled"]:
+        profiler.start()
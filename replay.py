@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# 回放基准模块：用录制好的话语离线回放语音识别流程
+# 统计字错误率(CER)、实时率和领域词汇的提示词/纠错开销
+import argparse
+import os
+import re
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config import CONFIG
+from utils import logger
+
+_PUNCTUATION = re.compile(r'[\s，。！？、；：,.!?;:"\'“”‘’（）()]')
+
+
+def load_wav(path: str) -> np.ndarray:
+    """读取16kHz单声道int16 WAV为float32"""
+    with wave.open(path, "rb") as f:
+        if f.getframerate() != CONFIG["sample_rate"] or f.getnchannels() != 1 or f.getsampwidth() != 2:
+            raise ValueError(f"{path}: 需要 {CONFIG['sample_rate']}Hz 单声道 16bit WAV")
+        frames = f.readframes(f.getnframes())
+    return np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def load_references(path: str) -> dict:
+    """参考文本文件：每行 `文件名<TAB>文本`"""
+    references = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if "\t" in line:
+                name, text = line.rstrip("\n").split("\t", 1)
+                references[name] = text
+    return references
+
+
+def char_error_rate(reference: str, hypothesis: str) -> float:
+    reference = _PUNCTUATION.sub("", reference)
+    hypothesis = _PUNCTUATION.sub("", hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    previous = list(range(len(hypothesis) + 1))
+    for i, r in enumerate(reference, 1):
+        current = [i] + [0] * len(hypothesis)
+        for j, h in enumerate(hypothesis, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def iter_utterances(directory: str):
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".wav"):
+            yield name, load_wav(os.path.join(directory, name))
+
+
+def iter_archive(directory: str):
+    """从音频归档读取话语，名称为 turn<轮次>_<归档时间>"""
+    from archive import AudioArchive
+    archive = AudioArchive(directory)
+    for record in archive.list_records():
+        name = f"turn{record.turn_id}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(record.timestamp))}"
+        yield name, archive.read(record).astype(np.float32) / 32768.0
+
+
+def run_replay(optimizer, utterances, references: dict) -> dict:
+    total_audio = 0.0
+    total_time = 0.0
+    errors = []
+    for name, audio in utterances:
+        start = time.perf_counter()
+        text = optimizer.transcribe_conversation_optimized(audio)
+        elapsed = time.perf_counter() - start
+        duration = len(audio) / CONFIG["sample_rate"]
+        total_audio += duration
+        total_time += elapsed
+
+        line = f"{name}: {elapsed * 1000:7.1f} ms  RTF {elapsed / duration:.3f}  {text}"
+        if name in references:
+            cer = char_error_rate(references[name], text)
+            errors.append(cer)
+            line += f"  (CER {cer:.3f})"
+        print(line)
+
+    return {
+        "utterances": len(errors) if references else None,
+        "rtf": total_time / total_audio if total_audio else 0.0,
+        "cer": sum(errors) / len(errors) if errors else None,
+    }
+
+
+def run_concurrent(optimizer, utterances, concurrency: int) -> dict:
+    """N个线程同时提交话语（模拟多路并发），统计总吞吐"""
+    total_audio = sum(len(audio) for _, audio in utterances) / CONFIG["sample_rate"]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        texts = list(executor.map(lambda item: optimizer.transcribe_conversation_optimized(item[1]), utterances))
+    elapsed = time.perf_counter() - start
+    return {
+        "texts": dict(zip((name for name, _ in utterances), texts)),
+        "elapsed": elapsed,
+        "throughput": total_audio / elapsed if elapsed else 0.0,
+    }
+
+
+def compare_batching(model, utterances, concurrency: int):
+    """同一并发度下分别关闭/开启批量调度，对比吞吐和识别结果"""
+    from stt import WhisperOptimizer
+    results = {}
+    for batch_enabled in (False, True):
+        CONFIG["stt_batch"]["enabled"] = batch_enabled
+        optimizer = WhisperOptimizer(model)
+        result = run_concurrent(optimizer, utterances, concurrency)
+        label = "批量" if batch_enabled else "逐条"
+        summary = f"[{label} x{concurrency}] 耗时 {result['elapsed']:.2f} s, 吞吐 {result['throughput']:.2f} 音频秒/秒"
+        if optimizer.batch_scheduler is not None:
+            stats = optimizer.batch_scheduler.stats
+            summary += (f", 批次 {stats['batches']} (最大 {stats['max_batch']}),"
+                        f" 单独解码 {stats['single_utterances']}, 回退 {stats['fallback_utterances']}")
+            optimizer.batch_scheduler.close()
+        print(summary)
+        results[batch_enabled] = result
+    
+    mismatched = [name for name, text in results[False]["texts"].items() if results[True]["texts"][name] != text]
+    for name in mismatched:
+        print(f"  ≠ {name}: {results[False]['texts'][name]} | {results[True]['texts'][name]}")
+    speedup = results[True]["throughput"] / results[False]["throughput"] if results[False]["throughput"] else 0.0
+    print(f"批量/逐条 吞吐比 {speedup:.2f}x, 结果不一致 {len(mismatched)}/{len(utterances)} 条")
+
+
+def print_summary(label: str, result: dict, optimizer):
+    summary = f"[{label}] 实时率 {result['rtf']:.3f}"
+    if result["cer"] is not None:
+        summary += f", 平均CER {result['cer']:.3f}"
+    if optimizer.vocabulary is not None:
+        stats = optimizer.vocabulary.get_stats()
+        summary += (f", 提示词开销 {stats['avg_param_ms']:.3f} ms/次"
+                    f" (编码 {stats['prompt_encodes']} 次), 纠错 {stats['corrections']} 处"
+                    f" / {stats['avg_correction_ms']:.3f} ms/次")
+    print(summary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语音识别回放基准")
+    parser.add_argument("directory", help="WAV话语目录（--archive时为归档目录）")
+    parser.add_argument("--archive", action="store_true", help="从对话音频归档读取话语")
+    parser.add_argument("--refs", help="参考文本文件（文件名<TAB>文本）")
+    parser.add_argument("--compare-vocab", action="store_true", help="分别在关闭/开启领域词汇时回放")
+    parser.add_argument("--concurrency", type=int, default=0, help="以N路并发回放，对比关闭/开启批量转录的吞吐")
+    args = parser.parse_args()
+
+    # 回放只测试识别，不加载唤醒模型
+    CONFIG["wake_word_mode"] = "replay"
+    from stt import load_model, WhisperOptimizer
+
+    references = load_references(args.refs) if args.refs else {}
+    source = iter_archive if args.archive else iter_utterances
+    utterances = list(source(args.directory))
+    logger.info(f"🔁 回放 {len(utterances)} 条话语")
+    model = load_model()
+
+    if args.concurrency > 0:
+        compare_batching(model, utterances, args.concurrency)
+        return
+
+    modes = [False, True] if args.compare_vocab else [CONFIG["vocabulary"]["enabled"]]
+    for vocab_enabled in modes:
+        CONFIG["vocabulary"]["enabled"] = vocab_enabled
+        optimizer = WhisperOptimizer(model)
+        result = run_replay(optimizer, utterances, references)
+        print_summary("领域词汇" if vocab_enabled else "无领域词汇", result, optimizer)
+
+
+if __name__ == "__main__":
+    main()
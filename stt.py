@@ -1,42 +1,435 @@
 # 语音转文本模块：使用Faster Whisper模型实现语音识别
 # 集成自适应噪声检测和动态阈值调整功能
 from faster_whisper import WhisperModel
+from faster_whisper.audio import pad_or_trim
+from faster_whisper.tokenizer import Tokenizer
+from faster_whisper.transcribe import get_compression_ratio, get_suppressed_tokens
+from faster_whisper.vad import VadOptions, collect_chunks, get_speech_timestamps, get_vad_model
+from functools import lru_cache
 from pathlib import Path
 # 添加缺失的导入
 import time
+import queue
+import threading
+from concurrent.futures import Future
 import numpy as np
 from config import CONFIG
 from utils import whisper_logger, system_logger
+from metrics import STT_RTF, registry
+from vocabulary import VocabularyBias
+from features import LogMelFeatureCache, CachedFeatureExtractor
+from profiling import profiled
 
 _model = None
 
+# 启动阶段耗时（秒），由print_startup_profile输出
+startup_profile = {}
+
+WARMUP_GAP = registry.gauge("stt_warmup_gap_seconds", "预热时首次与再次解码的耗时差", ["params"])
+
 # 保留原有的load_model和transcribe函数
 
-def load_model():
+def load_model(warmup: bool = True):
     global _model
     if _model is None:
         whisper_logger.info("🔄 正在加载本地模型...")
+        start_time = time.time()
         _model = WhisperModel(
             CONFIG["local_model_path"],
             device="cpu",
             compute_type=CONFIG["compute_type"],
             cpu_threads=2,
+            num_workers=1,
             local_files_only=True
         )
+        startup_profile["模型加载"] = time.time() - start_time
+        if warmup and CONFIG["whisper_warmup"]["enabled"]:
+            warmup_model(_model)
     return _model
 
 
+@lru_cache(maxsize=4)
+def get_stft_window(n_fft: int) -> np.ndarray:
+    """缓存的周期Hann窗（与faster-whisper特征提取一致）"""
+    return np.hanning(n_fft + 1)[:-1].astype(np.float32)
+
+
+def get_mel_constants(feature_extractor):
+    """返回(STFT窗, 梅尔滤波器组)，滤波器组由特征提取器在构造时计算并保存"""
+    return get_stft_window(feature_extractor.n_fft), feature_extractor.mel_filters
+
+
+def warmup_model(model, param_sets: dict = None) -> dict:
+    """预热：预加载VAD模型，并用合成音频跑一遍各组解码参数
+
+    每组参数连续解码两次，首次耗时减去再次耗时即为首轮延迟差。
+    """
+    param_sets = param_sets or CONFIG["whisper_params"]
+    total_start = time.time()
+
+    start_time = time.time()
+    get_vad_model()
+    startup_profile["VAD模型加载"] = time.time() - start_time
+
+    # 低幅噪声叠加语音频段正弦波，保证解码器真正运行
+    sample_rate = CONFIG["sample_rate"]
+    samples = int(sample_rate * CONFIG["whisper_warmup"]["audio_seconds"])
+    rng = np.random.default_rng(0)
+    t = np.arange(samples) / sample_rate
+    audio = (0.05 * np.sin(2 * np.pi * 220 * t) + 0.005 * rng.standard_normal(samples)).astype(np.float32)
+
+    # 单独运行一次VAD，解码时关闭VAD以免合成音频被整体过滤
+    get_speech_timestamps(audio)
+
+    results = {}
+    for name, params in param_sets.items():
+        params = {**params, "vad_filter": False}
+        timings = []
+        for _ in range(2):
+            start_time = time.time()
+            segments, _ = model.transcribe(audio, **params)
+            list(segments)
+            timings.append(time.time() - start_time)
+        results[name] = {"cold": timings[0], "warm": timings[1], "gap": timings[0] - timings[1]}
+        startup_profile[f"预热[{name}]首次解码"] = timings[0]
+        startup_profile[f"预热[{name}]再次解码"] = timings[1]
+        WARMUP_GAP.labels(name).set(results[name]["gap"])
+
+    startup_profile["预热总耗时"] = time.time() - total_start
+    summary = ", ".join(f"{name} 首轮差 {r['gap'] * 1000:.0f}ms" for name, r in results.items())
+    whisper_logger.info(f"🔥 Whisper预热完成: {summary}")
+    return results
+
+
+def print_startup_profile():
+    """输出启动阶段耗时"""
+    for stage, duration in startup_profile.items():
+        system_logger.info(f"⏱️ 启动 {stage}: {duration * 1000:.1f}ms")
+
+
+def unload_model():
+    """释放全局模型，下次load_model时重新加载"""
+    global _model
+    _model = None
+
+
 def transcribe(audio) -> str:
     model = load_model()
     segments, _ = model.transcribe(audio, beam_size=5, language="zh")
     return "".join(s.text for s in segments).strip()
 
-class WhisperOptimizer:
-    ""Whisper优化器 - 支持openwakeword和whisper双模式""
+# 批量路径能按transcribe语义处理的解码参数；含其他参数的话语单独解码
+_BATCH_PARAMS = frozenset({
+    "language", "beam_size", "temperature", "no_speech_threshold", "compression_ratio_threshold",
+    "log_prob_threshold", "vad_filter", "vad_parameters", "initial_prompt", "hotwords",
+    "without_timestamps",
+})
+
+
+def _temperatures(params) -> tuple:
+    temperature = params.get("temperature", 0.0)
+    return tuple(temperature) if isinstance(temperature, (list, tuple)) else (temperature,)
+
+
+def transcribe_segments(model, audio, params, offset=None) -> list:
+    """常规transcribe，返回[(片段文本, 平均对数概率)]；提供采集流偏移且未启用VAD裁剪时复用log-mel特征缓存"""
+    extractor = model.feature_extractor
+    if offset is not None and not params.get("vad_filter") and isinstance(extractor, CachedFeatureExtractor):
+        with extractor.bind(offset, len(audio)):
+            segments, _ = model.transcribe(audio, **params)
+            return [(seg.text, seg.avg_logprob) for seg in segments]
+    segments, _ = model.transcribe(audio, **params)
+    return [(seg.text, seg.avg_logprob) for seg in segments]
+
+
+class _BatchRequest:
+    """等待批量解码的单条话语"""
+    __slots__ = ("audio", "params", "offset", "future", "arrival")
+
+    def __init__(self, audio, params, offset=None):
+        self.audio = audio
+        self.params = params
+        self.offset = offset
+        self.future = Future()
+        self.arrival = time.time()
+
+
+class BatchTranscriptionScheduler:
+    """批量转录调度器 - 合并并发话语，一次CTranslate2 generate完成解码
+    
+    空闲时单条请求立即解码；近期出现并发时才等待收集窗口，
+    且任何请求的排队时间不超过max_wait_ms，保证单用户延迟不回退。
+    """
     
     def __init__(self, whisper_model):
         self.whisper_model = whisper_model
-        self.wake_word_detector = WakeWordDetector() if CONFIG["wake_word_mode"] == "openwakeword" else None
+        self.config = CONFIG["stt_batch"]
+        self.window = self.config["window_ms"] / 1000.0
+        self.max_wait = self.config["max_wait_ms"] / 1000.0
+        self.max_batch_size = self.config["max_batch_size"]
+        self.max_samples = whisper_model.feature_extractor.n_samples
+        
+        self._queue = queue.Queue()
+        self._tokenizers = {}
+        self._last_concurrent = 0.0
+        self._warned_params = set()
+        self._running = True
+        
+        self.stats = {
+            "batches": 0,
+            "batched_utterances": 0,
+            "single_utterances": 0,
+            "fallback_utterances": 0,
+            "max_batch": 0,
+        }
+        
+        self._thread = threading.Thread(target=self._run, name="stt-batch", daemon=True)
+        self._thread.start()
+    
+    def submit(self, audio, params, offset=None) -> Future:
+        """提交一条话语，返回在解码完成后填充[(片段文本, 平均对数概率)]的Future"""
+        request = _BatchRequest(np.asarray(audio, dtype=np.float32), params, offset)
+        self._queue.put(request)
+        return request.future
+    
+    def transcribe(self, audio, params, offset=None) -> list:
+        return self.submit(audio, params, offset).result()
+    
+    def close(self):
+        self._running = False
+        self._queue.put(None)
+        self._thread.join(timeout=2)
+    
+    def _run(self):
+        while self._running:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            for bucket in self._bucketize(batch):
+                self._dispatch(bucket)
+    
+    def _collect(self, first):
+        batch = [first]
+        # 近期无并发时不等待，只合并已在排队的请求
+        if time.time() - self._last_concurrent > 10.0:
+            deadline = time.time()
+        else:
+            deadline = first.arrival + min(self.window, self.max_wait)
+        
+        while len(batch) < self.max_batch_size:
+            try:
+                timeout = deadline - time.time()
+                if timeout > 0:
+                    request = self._queue.get(timeout=timeout)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._running = False
+                break
+            batch.append(request)
+        
+        if len(batch) > 1:
+            self._last_concurrent = time.time()
+        return batch
+    
+    def _batchable(self, request) -> bool:
+        """只有不超过30秒、参数都能在批量路径中处理的话语才参与合并"""
+        if len(request.audio) > self.max_samples:
+            return False
+        unsupported = set(request.params) - _BATCH_PARAMS
+        if _temperatures(request.params)[0] > 0:
+            unsupported.add("temperature")
+        if unsupported:
+            key = tuple(sorted(unsupported))
+            if key not in self._warned_params:
+                self._warned_params.add(key)
+                whisper_logger.warning(f"⚠️ 批量解码不支持参数 {', '.join(key)}，相关话语单独解码")
+            return False
+        return True
+    
+    def _bucketize(self, batch):
+        """按解码参数和时长分桶"""
+        bucket_samples = self.config["bucket_seconds"] * CONFIG["sample_rate"]
+        buckets = {}
+        for request in batch:
+            if not self._batchable(request):
+                buckets.setdefault(("single", id(request)), []).append(request)
+                continue
+            key = (
+                tuple(sorted((k, str(v)) for k, v in request.params.items())),
+                len(request.audio) // bucket_samples,
+            )
+            buckets.setdefault(key, []).append(request)
+        return buckets.values()
+    
+    def _dispatch(self, bucket):
+        try:
+            if len(bucket) == 1:
+                # 没有可合并的话语时走常规transcribe，质量与未开启批量时一致
+                texts = [self._transcribe_single(bucket[0])]
+            else:
+                texts = self._decode_batch(bucket)
+            for request, text in zip(bucket, texts):
+                request.future.set_result(text)
+        except Exception as e:
+            whisper_logger.error(f"批量转录失败: {e}")
+            for request in bucket:
+                if not request.future.done():
+                    request.future.set_exception(e)
+    
+    def _transcribe_single(self, request) -> list:
+        """完整的transcribe：VAD、温度回退、压缩比/对数概率检查和热词"""
+        self.stats["single_utterances"] += 1
+        return transcribe_segments(self.whisper_model, request.audio, request.params, request.offset)
+    
+    def _get_tokenizer(self, language):
+        tokenizer = self._tokenizers.get(language)
+        if tokenizer is None:
+            tokenizer = Tokenizer(
+                self.whisper_model.hf_tokenizer,
+                self.whisper_model.model.is_multilingual,
+                task="transcribe",
+                language=language,
+            )
+            self._tokenizers[language] = tokenizer
+        return tokenizer
+    
+    def _speech_audio(self, request):
+        """vad_filter时与transcribe一样只保留语音片段"""
+        params = request.params
+        if not params.get("vad_filter"):
+            return request.audio
+        vad_parameters = params.get("vad_parameters")
+        if isinstance(vad_parameters, dict):
+            vad_parameters = VadOptions(**vad_parameters)
+        speech_chunks = get_speech_timestamps(request.audio, vad_parameters)
+        if not speech_chunks:
+            return request.audio[:0]
+        audio_chunks, _ = collect_chunks(request.audio, speech_chunks)
+        return np.concatenate(audio_chunks)
+    
+    def _extract_features(self, request, audio):
+        extractor = self.whisper_model.feature_extractor
+        # VAD裁剪后的音频与采集流偏移不再对应，不走特征缓存
+        if audio is request.audio and request.offset is not None and isinstance(extractor, CachedFeatureExtractor):
+            with extractor.bind(request.offset, len(audio)):
+                return extractor(audio)
+        return extractor(audio)
+    
+    def _prompt(self, tokenizer, params):
+        """与transcribe相同的提示构造：initial_prompt作为前文，hotwords在无前缀时插入"""
+        initial_prompt = params.get("initial_prompt")
+        if isinstance(initial_prompt, str):
+            previous_tokens = tokenizer.encode(" " + initial_prompt.strip())
+        else:
+            previous_tokens = list(initial_prompt or ())
+        return self.whisper_model.get_prompt(
+            tokenizer, previous_tokens,
+            without_timestamps=params.get("without_timestamps", False),
+            hotwords=params.get("hotwords"),
+        )
+    
+    @profiled("stt_batch_decode")
+    def _decode_batch(self, bucket):
+        model = self.whisper_model
+        params = bucket[0].params
+        tokenizer = self._get_tokenizer(params.get("language", "zh"))
+        
+        texts = [[] for _ in bucket]
+        speech = []
+        for i, request in enumerate(bucket):
+            audio = self._speech_audio(request)
+            if len(audio):
+                speech.append((i, request, audio))
+        if not speech:
+            return texts
+        
+        features = [self._extract_features(request, audio) for _, request, audio in speech]
+        encoder_output = model.encode(np.stack([pad_or_trim(f[..., :-1]) for f in features]))
+        
+        # 其余解码参数取transcribe的默认值（不在_BATCH_PARAMS中的参数不会进入批量路径）
+        results = model.model.generate(
+            encoder_output,
+            [self._prompt(tokenizer, params)] * len(speech),
+            beam_size=params.get("beam_size", 5),
+            patience=1,
+            length_penalty=1,
+            repetition_penalty=1,
+            no_repeat_ngram_size=0,
+            max_length=model.max_length,
+            return_scores=True,
+            return_no_speech_prob=True,
+            suppress_blank=True,
+            suppress_tokens=get_suppressed_tokens(tokenizer, [-1]),
+            max_initial_timestamp_index=int(round(1.0 / model.time_precision)),
+        )
+        
+        # 与transcribe相同的静音判定和质量检查；未通过且配置了温度回退、
+        # 或一个窗口没有解码完整段音频的话语单独重解
+        no_speech_threshold = params.get("no_speech_threshold", 0.6)
+        log_prob_threshold = params.get("log_prob_threshold", -1.0)
+        compression_ratio_threshold = params.get("compression_ratio_threshold", 2.4)
+        can_fallback = len(_temperatures(params)) > 1
+        time_per_frame = model.feature_extractor.time_per_frame
+        for (i, request, _), feature, result in zip(speech, features, results):
+            tokens = result.sequences_ids[0]
+            avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+            text = tokenizer.decode(tokens).strip()
+            low_logprob = log_prob_threshold is not None and avg_logprob < log_prob_threshold
+            if no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold and \
+                    not (log_prob_threshold is not None and avg_logprob > log_prob_threshold):
+                continue
+            repetitive = compression_ratio_threshold is not None and \
+                get_compression_ratio(text) > compression_ratio_threshold
+            content_frames = feature.shape[-1] - 1
+            segment_size = min(model.feature_extractor.nb_max_frames, content_frames)
+            segments, seek, _ = model._split_segments_by_timestamps(
+                tokenizer=tokenizer,
+                tokens=tokens,
+                time_offset=0.0,
+                segment_size=segment_size,
+                segment_duration=segment_size * time_per_frame,
+                seek=0,
+            )
+            if (can_fallback and (repetitive or low_logprob)) or seek < content_frames:
+                self.stats["fallback_utterances"] += 1
+                texts[i] = transcribe_segments(model, request.audio, request.params, request.offset)
+                continue
+            for segment in segments:
+                segment_text = tokenizer.decode(segment["tokens"])
+                if segment["start"] != segment["end"] and segment_text.strip():
+                    texts[i].append((segment_text, avg_logprob))
+        
+        self.stats["batches"] += 1
+        self.stats["batched_utterances"] += len(bucket)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(bucket))
+        whisper_logger.debug(f"📦 批量解码 {len(bucket)} 条话语")
+        return texts
+
+class WhisperOptimizer:
+    """Whisper优化器 - 支持openwakeword和whisper双模式"""
+    
+    def __init__(self, whisper_model, wake_word_detector=None):
+        self.whisper_model = whisper_model
+        # 复用主程序的唤醒检测器，避免重复加载openwakeword模型
+        self.wake_word_detector = wake_word_detector
+        self.batch_scheduler = BatchTranscriptionScheduler(whisper_model) if CONFIG["stt_batch"]["enabled"] else None
+        self.vocabulary = VocabularyBias() if CONFIG["vocabulary"]["enabled"] else None
+        self._loading_thread = None
+        self.feature_cache = None
+        if CONFIG["feature_cache"]["enabled"] and CONFIG["whisper_params"]["conversation"].get("vad_filter"):
+            system_logger.info("♻️ 对话解码开启了vad_filter，log-mel特征缓存不会命中，未启用")
+        elif CONFIG["feature_cache"]["enabled"]:
+            fe = whisper_model.feature_extractor
+            window, mel_filters = get_mel_constants(fe)
+            self.feature_cache = LogMelFeatureCache(
+                fe.n_fft, fe.hop_length, window, mel_filters,
+                CONFIG["audio_capture"]["ring_seconds"]
+            )
+            self._install_feature_cache(whisper_model)
         
         # 性能统计
         self.timing_stats = {
@@ -55,6 +448,47 @@ class WhisperOptimizer:
         
         system_logger.info(f"🎯 唤醒模式: {CONFIG['wake_word_mode']}")
     
+    def preload_model_async(self):
+        """模型已卸载时后台重新加载（唤醒后、录音期间进行）
+        
+        不做预热：预热的多次解码会和本轮录音结束后的转录争用CPU，反而拖慢这一轮
+        """
+        if self.whisper_model is not None or self._loading_thread is not None:
+            return
+        
+        def _load():
+            self.whisper_model = load_model(warmup=False)
+        
+        self._loading_thread = threading.Thread(target=_load, name="whisper-reload", daemon=True)
+        self._loading_thread.start()
+    
+    def release_model(self):
+        """卸载Whisper模型（内存紧张时的最后一级清理），下次转录时重新加载"""
+        if self.whisper_model is None:
+            return
+        if self.batch_scheduler is not None:
+            # 调度器也持有模型引用，一并关闭，重新加载后再创建
+            self.batch_scheduler.close()
+            self.batch_scheduler = None
+        self.whisper_model = None
+        unload_model()
+        whisper_logger.info("🤖 Whisper模型已卸载")
+    
+    def _install_feature_cache(self, model):
+        if self.feature_cache is not None and not isinstance(model.feature_extractor, CachedFeatureExtractor):
+            model.feature_extractor = CachedFeatureExtractor(model.feature_extractor, self.feature_cache)
+    
+    def _ensure_model(self):
+        if self._loading_thread is not None:
+            self._loading_thread.join()
+            self._loading_thread = None
+        if self.whisper_model is None:
+            self.whisper_model = load_model(warmup=False)
+        self._install_feature_cache(self.whisper_model)
+        if self.batch_scheduler is None and CONFIG["stt_batch"]["enabled"]:
+            self.batch_scheduler = BatchTranscriptionScheduler(self.whisper_model)
+        return self.whisper_model
+    
     def detect_wake_word_optimized(self, audio):
         start_time = time.time()
         
@@ -65,6 +499,8 @@ class WhisperOptimizer:
         try:
             # 使用openwakeword检测
             detected, score = self.wake_word_detector.detect(audio)
+            if detected:
+                self.preload_model_async()
             self._update_timing_stats("wake_word", time.time() - start_time)
             return detected, "wake_word_detected" if detected else ""
             
@@ -72,7 +508,14 @@ class WhisperOptimizer:
             whisper_logger.error(f"唤醒词检测失败: {e}")
             return False, ""
     
-    def transcribe_conversation_optimized(self, audio):
+    @profiled("stt")
+    def transcribe_conversation_optimized(self, audio, offset=None):
+        """转录对话音频
+
+        Args:
+            audio: float32音频
+            offset: 音频在采集流中的绝对采样偏移，提供时复用采集路径喂入的log-mel特征缓存
+        """
         start_time = time.time()
         
         # 测量背景噪声（如果启用）
@@ -86,14 +529,24 @@ class WhisperOptimizer:
             else:
                 params = CONFIG["whisper_params"]["conversation"]
             
-            segments, _ = self.whisper_model.transcribe(
-                audio,
-                **params
-            )
+            if self.vocabulary is not None:
+                params = {**params, **self.vocabulary.get_decode_params(self._ensure_model())}
+            
+            model = self._ensure_model()
             
-            text = "".join(seg.text for seg in segments).strip()
+            if self.batch_scheduler is not None:
+                pieces = self.batch_scheduler.transcribe(audio, params, offset)
+            else:
+                pieces = transcribe_segments(model, audio, params, offset)
+            
+            if self.vocabulary is not None:
+                # 逐片段纠错，解码器有把握的片段不改
+                pieces = [(self.vocabulary.correct(piece, avg_logprob), avg_logprob) for piece, avg_logprob in pieces]
+            text = "".join(piece for piece, _ in pieces).strip()
             
-            self._update_timing_stats("conversation", time.time() - start_time)
+            duration = time.time() - start_time
+            self._update_timing_stats("conversation", duration)
+            STT_RTF.labels("conversation").observe(duration * CONFIG["sample_rate"] / max(len(audio), 1))
             return text
             
         except Exception as e:
@@ -123,6 +576,22 @@ class WhisperOptimizer:
             avg_conv_time = self.timing_stats["total_conversation_time"] / conv_calls
             whisper_logger.info(f"🤖 对话转录: {conv_calls} 次，平均耗时: {avg_conv_time:.3f}s")
         
+        if self.batch_scheduler is not None:
+            batch_stats = self.batch_scheduler.stats
+            if batch_stats["batches"] > 0:
+                avg_batch = batch_stats["batched_utterances"] / batch_stats["batches"]
+                whisper_logger.info(f"📦 批量解码: {batch_stats['batches']} 批，平均 {avg_batch:.1f} 条/批，最大 {batch_stats['max_batch']} 条，单独解码 {batch_stats['single_utterances']} 条，回退重解 {batch_stats['fallback_utterances']} 条")
+        
+        if self.feature_cache is not None:
+            cache_stats = self.feature_cache.stats
+            lookups = cache_stats["hits"] + cache_stats["misses"]
+            if lookups > 0:
+                whisper_logger.info(f"♻️ 特征缓存: 命中 {cache_stats['hits']}/{lookups}, 复用 {cache_stats['frames_reused']} 帧, 计算 {cache_stats['frames_computed']} 帧")
+        
+        if self.vocabulary is not None:
+            vocab_stats = self.vocabulary.get_stats()
+            whisper_logger.info(f"📚 领域词汇: 提示词开销 {vocab_stats['avg_param_ms']:.3f}ms/次, 纠错 {vocab_stats['corrections']} 处, 纠错耗时 {vocab_stats['avg_correction_ms']:.3f}ms/次")
+        
         # 打印背景噪声信息
         if CONFIG["adaptive_noise"]["enabled"]:
             status = self.get_adaptive_status()
@@ -134,7 +603,7 @@ class WhisperOptimizer:
             whisper_logger.info(f"🔊 当前背景噪声: {self.background_noise_db:.1f} dB")
     
     def get_adaptive_params(self, params_type: str = "wake_word"):
-        ""获取自适应参数""
+        """获取自适应参数"""
         base_params = CONFIG["whisper_params"][params_type].copy()
         
         # 动态调整no_speech_threshold
@@ -144,7 +613,7 @@ class WhisperOptimizer:
         return base_params
     
     def get_adaptive_status(self):
-        ""获取自适应状态信息""
+        """获取自适应状态信息"""
         if not CONFIG["adaptive_noise"]["enabled"]:
             return "自适应噪声检测已禁用"
         
@@ -203,7 +672,7 @@ class WhisperOptimizer:
             return -70  # 默认值
     
     def adaptive_no_speech_threshold(self):
-        ""根据背景噪声动态调整阈值"""
+        """根据背景噪声动态调整阈值"""
         noise_config = CONFIG["adaptive_noise"]
         thresholds = noise_config["noise_thresholds"]
         values = noise_config["threshold_values"]
@@ -219,4 +688,3 @@ class WhisperOptimizer:
             whisper_logger.debug(f"🔊 安静环境，使用低阈值: {threshold}")
         
         return threshold
-}
@@ -0,0 +1,54 @@
+# log-mel特征缓存测试：采集路径逐块喂入后，对同一段录音的解码应命中缓存
+import numpy as np
+import pytest
+
+feature_extractor = pytest.importorskip("faster_whisper.feature_extractor")
+
+from features import CachedFeatureExtractor, LogMelFeatureCache
+
+SAMPLE_RATE = 16000
+BLOCK = 1600
+
+
+@pytest.fixture
+def stream():
+    rng = np.random.default_rng(0)
+    t = np.arange(SAMPLE_RATE * 5) / SAMPLE_RATE
+    return (0.1 * np.sin(2 * np.pi * 440 * t) + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+@pytest.fixture
+def extractor(stream):
+    base = feature_extractor.FeatureExtractor()
+    window = np.hanning(base.n_fft + 1)[:-1].astype(np.float32)
+    cache = LogMelFeatureCache(base.n_fft, base.hop_length, window, base.mel_filters, 60)
+    for offset in range(0, len(stream), BLOCK):
+        cache.feed(offset, stream[offset:offset + BLOCK])
+    return CachedFeatureExtractor(base, cache)
+
+
+@pytest.mark.parametrize("offset", [0, 16000, 16080, 16037])
+def test_repeated_decode_hits_cache(extractor, stream, offset):
+    audio = stream[offset:offset + SAMPLE_RATE]
+    expected = extractor.base(audio)
+    for _ in range(2):
+        with extractor.bind(offset, len(audio)):
+            features = extractor(audio)
+        assert features.shape == expected.shape
+    assert extractor.cache.stats == {**extractor.cache.stats, "hits": 2, "misses": 0}
+
+
+def test_aligned_offset_matches_base_extractor(extractor, stream):
+    audio = stream[16000:16000 + SAMPLE_RATE]
+    with extractor.bind(16000, len(audio)):
+        features = extractor(audio)
+    # 首帧左侧用的是真实上下文而不是反射填充，其余帧应与原算法一致
+    np.testing.assert_allclose(features[:, 2:], extractor.base(audio)[:, 2:], atol=1e-3)
+
+
+def test_unbound_or_trimmed_audio_uses_base_extractor(extractor, stream):
+    audio = stream[16000:16000 + SAMPLE_RATE]
+    with extractor.bind(16000, len(audio) + 1):
+        extractor(audio)
+    assert extractor.cache.stats["hits"] == 0
+    assert extractor.cache.stats["misses"] == 1
@@ -0,0 +1,139 @@
+# 批量转录测试：并发话语合并解码后，结果应与逐条transcribe一致
+# 使用随机权重的微型Whisper模型，不依赖下载的模型文件
+import time
+import numpy as np
+import pytest
+
+ctranslate2 = pytest.importorskip("ctranslate2")
+tokenizers = pytest.importorskip("tokenizers")
+pytest.importorskip("faster_whisper")
+
+from ctranslate2.specs import whisper_spec
+from faster_whisper import WhisperModel
+from faster_whisper.tokenizer import _LANGUAGE_CODES
+
+from stt import BatchTranscriptionScheduler, transcribe_segments
+
+D_MODEL = 64
+
+
+def _byte_tokens():
+    """GPT-2字节级BPE的256个基础字符"""
+    printable = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + \
+        list(range(ord("®"), ord("ÿ") + 1))
+    chars, extra = printable[:], 0
+    for b in range(256):
+        if b not in printable:
+            chars.append(256 + extra)
+            extra += 1
+    return [chr(c) for c in chars]
+
+
+def _build_tokenizer():
+    """与多语言Whisper相同的词表布局：50257个普通词元 + 特殊词元 + 1501个时间戳"""
+    vocab = {token: i for i, token in enumerate(_byte_tokens())}
+    while len(vocab) < 50257:
+        vocab[f"tok{len(vocab)}"] = len(vocab)
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.BPE(vocab=vocab, merges=[]))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = tokenizers.decoders.ByteLevel()
+    languages = ["en"] + [code for code in _LANGUAGE_CODES if code != "en"]
+    tokenizer.add_special_tokens(
+        ["<|endoftext|>", "<|startoftranscript|>"] + [f"<|{code}|>" for code in languages] +
+        ["<|translate|>", "<|transcribe|>", "<|startoflm|>", "<|startofprev|>", "<|nocaptions|>", "<|notimestamps|>"]
+    )
+    tokens = sorted(tokenizer.get_vocab(), key=tokenizer.token_to_id)
+    # CTranslate2以词表中是否存在空词元判断多语言模型（与官方词表一致）
+    tokens[50256] = ""
+    tokens += [f"<|{i * 0.02:.2f}|>" for i in range(1501)]
+    return tokenizer, tokens, languages
+
+
+@pytest.fixture(scope="module")
+def tiny_model(tmp_path_factory):
+    model_dir = tmp_path_factory.mktemp("tiny-whisper")
+    tokenizer, tokens, languages = _build_tokenizer()
+    tokenizer.save(str(model_dir / "tokenizer.json"))
+
+    rng = np.random.default_rng(0)
+
+    def weight(*shape):
+        return (rng.standard_normal(shape) * 0.2).astype(np.float32)
+
+    def layer_norm(spec):
+        spec.gamma = np.ones(D_MODEL, np.float32)
+        spec.beta = np.zeros(D_MODEL, np.float32)
+
+    def linear(spec, out_dim, in_dim):
+        spec.weight = weight(out_dim, in_dim)
+        spec.bias = weight(out_dim)
+
+    def attention(spec, fused):
+        for sub, out_dim in zip(spec.linear, fused):
+            linear(sub, out_dim, D_MODEL)
+        layer_norm(spec.layer_norm)
+
+    def ffn(spec):
+        linear(spec.linear_0, 2 * D_MODEL, D_MODEL)
+        linear(spec.linear_1, D_MODEL, 2 * D_MODEL)
+        layer_norm(spec.layer_norm)
+
+    spec = whisper_spec.WhisperSpec(1, 2, 1, 2)
+    encoder, decoder = spec.encoder, spec.decoder
+    encoder.conv1.weight, encoder.conv1.bias = weight(D_MODEL, 80, 3), weight(D_MODEL)
+    encoder.conv2.weight, encoder.conv2.bias = weight(D_MODEL, D_MODEL, 3), weight(D_MODEL)
+    encoder.position_encodings.encodings = weight(1500, D_MODEL)
+    layer_norm(encoder.layer_norm)
+    for layer in encoder.layer:
+        attention(layer.self_attention, (3 * D_MODEL, D_MODEL))
+        ffn(layer.ffn)
+    decoder.embeddings.weight = weight(len(tokens), D_MODEL)
+    decoder.position_encodings.encodings = weight(448, D_MODEL)
+    decoder.projection.weight = decoder.embeddings.weight
+    layer_norm(decoder.layer_norm)
+    for layer in decoder.layer:
+        attention(layer.self_attention, (3 * D_MODEL, D_MODEL))
+        attention(layer.attention, (D_MODEL, 2 * D_MODEL, D_MODEL))
+        ffn(layer.ffn)
+
+    spec.register_vocabulary(tokens)
+    spec.config.suppress_ids = []
+    spec.config.suppress_ids_begin = [220, tokens.index("<|endoftext|>")]
+    spec.config.lang_ids = [tokens.index(f"<|{code}|>") for code in languages]
+    spec.config.alignment_heads = [(0, 0), (0, 1)]
+    spec.validate()
+    spec.optimize(quantization=None)
+    spec.save(str(model_dir))
+    return WhisperModel(str(model_dir), device="cpu", compute_type="float32")
+
+
+@pytest.fixture
+def utterances():
+    rng = np.random.default_rng(1)
+    return [(rng.standard_normal(int(16000 * seconds)) * 0.1).astype(np.float32) for seconds in (2.0, 2.5, 3.0)]
+
+
+@pytest.mark.parametrize("without_timestamps", [False, True])
+def test_batched_decode_matches_transcribe(tiny_model, utterances, without_timestamps):
+    params = {
+        "language": "zh",
+        "beam_size": 2,
+        "temperature": 0.0,
+        "no_speech_threshold": None,
+        "vad_filter": False,
+        "without_timestamps": without_timestamps,
+    }
+    scheduler = BatchTranscriptionScheduler(tiny_model)
+    try:
+        # 模拟近期出现过并发，让调度器等待收集窗口
+        scheduler._last_concurrent = time.time()
+        futures = [scheduler.submit(audio, params) for audio in utterances]
+        batched = [future.result(timeout=60) for future in futures]
+        assert scheduler.stats["max_batch"] == len(utterances)
+    finally:
+        scheduler.close()
+
+    for audio, segments in zip(utterances, batched):
+        expected = transcribe_segments(tiny_model, audio, params)
+        assert [text for text, _ in segments] == [text for text, _ in expected]
+        assert [logprob for _, logprob in segments] == pytest.approx([logprob for _, logprob in expected], abs=1e-4)
@@ -0,0 +1,54 @@
+# 领域词汇纠错测试：默认词表下普通文本不应被改写
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("pypinyin")
+
+from vocabulary import VocabularyBias
+
+
+class _Tokenizer:
+    def encode(self, text, add_special_tokens=False):
+        return SimpleNamespace(ids=list(range(len(text))))
+
+
+@pytest.fixture
+def bias():
+    vocabulary = VocabularyBias()
+    vocabulary.get_decode_params(SimpleNamespace(hf_tokenizer=_Tokenizer(), max_length=448))
+    return vocabulary
+
+
+@pytest.mark.parametrize("text", ["臭小子", "晓之以理", "小字", "床脸上", "我们小组的小字报"])
+def test_ordinary_text_is_not_rewritten(bias, text):
+    assert bias.correct(text) == text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("小志你好", "小智你好"),         # 2字词：带声调读音完全相同
+    ("打开客厅等", "打开客厅灯"),     # 3字词：允许一个音节不同
+    ("请打开窗连", "请打开窗帘"),
+])
+def test_homophones_are_corrected(bias, text, expected):
+    assert bias.correct(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "我在客厅里看书",   # 里/灯 声母韵母都不同
+    "卧室门",           # 门/灯 只有韵母相同，m/d不易混
+    "卧室内",
+    "客厅的灯",         # 的/灯 韵母e/en不易混
+    "把加速器打开",     # 速/湿 韵母u/i不易混
+])
+def test_unrelated_syllables_are_not_near_misses(bias, text):
+    assert bias.correct(text) == text
+
+
+def test_confusable_initial_is_a_near_miss(bias):
+    # 冷/人：韵母相同，r/l易混
+    assert bias.correct("打开扫地机器冷") == "打开扫地机器人"
+
+
+def test_confident_segments_are_left_alone(bias):
+    assert bias.correct("打开客厅等", avg_logprob=-0.1) == "打开客厅等"
+    assert bias.correct("打开客厅等", avg_logprob=-0.9) == "打开客厅灯"
@@ -1,39 +1,197 @@
 # 文本转语音模块：使用edge_tts库实现语音合成
-# 提供文本转语音、音频播放和TTS缓存清理功能
+# 提供文本转语音、流式MP3解码、音频播放和TTS缓存清理功能
+import asyncio
 import edge_tts
 import io
+import time
+import numpy as np
 from pydub import AudioSegment
 from config import CONFIG
 from utils import logger
+from metrics import TTS_LATENCY, TTS_FIRST_AUDIO
+from profiling import profiled
+from devices import playback, portaudio_lock
 import sounddevice as sd
 
-async def text_to_speech(text):
+try:
+    import av
+except ImportError:  # 未安装PyAV时回退到pydub(ffmpeg子进程)
+    av = None
+
+
+class StreamingMp3Decoder:
+    """进程内增量MP3解码器
+
+    逐块喂入edge_tts的MP3数据，解码并重采样到播放采样率，
+    输出固定长度的int16 PCM块；不启动ffmpeg子进程，也不拼接完整MP3。
+    """
+
+    def __init__(self, sample_rate: int, block_size: int):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.codec = av.CodecContext.create("mp3", "r")
+        self.resampler = av.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+        self._block = np.empty(block_size, dtype=np.int16)
+        self._filled = 0
+        self.decode_errors = 0
+
+    @profiled("tts_decode")
+    def feed(self, data: bytes) -> list:
+        """喂入一段MP3数据，返回已凑满的PCM块"""
+        blocks = []
+        self._decode(self.codec.parse(data), blocks)
+        return blocks
+
+    @profiled("tts_decode")
+    def flush(self) -> list:
+        """输入结束：冲刷解析器、解码器和重采样器，最后一块按实际长度返回"""
+        blocks = []
+        self._decode(self.codec.parse(None), blocks)
+        self._decode([None], blocks)
+        for frame in self.resampler.resample(None):
+            self._append(frame.to_ndarray()[0], blocks)
+        if self._filled:
+            blocks.append(self._block[:self._filled].copy())
+            self._filled = 0
+        return blocks
+
+    def _decode(self, packets, blocks):
+        for packet in packets:
+            try:
+                frames = self.codec.decode(packet)
+            except av.error.InvalidDataError:
+                # ID3标签等非音频数据
+                self.decode_errors += 1
+                continue
+            for frame in frames:
+                for resampled in self.resampler.resample(frame):
+                    self._append(resampled.to_ndarray()[0], blocks)
+
+    def _append(self, samples: np.ndarray, blocks: list):
+        offset = 0
+        while offset < len(samples):
+            count = min(self.block_size - self._filled, len(samples) - offset)
+            self._block[self._filled:self._filled + count] = samples[offset:offset + count]
+            self._filled += count
+            offset += count
+            if self._filled == self.block_size:
+                blocks.append(self._block)
+                self._block = np.empty(self.block_size, dtype=np.int16)
+                self._filled = 0
+
+
+async def synthesize_stream(text, voice=None):
+    """流式语音合成：MP3分块到达即解码，逐块产出播放采样率的int16 PCM"""
+    sample_rate = CONFIG["sample_rate"]
+    decoder = StreamingMp3Decoder(sample_rate, int(sample_rate * CONFIG["tts"]["block_ms"] / 1000))
+    tts = edge_tts.Communicate(text=text, voice=voice or CONFIG["voice"])
+
+    start_time = time.time()
+    first_audio = True
+    async for chunk in tts.stream():
+        if chunk["type"] != "audio":
+            continue
+        for block in decoder.feed(chunk["data"]):
+            if first_audio:
+                TTS_FIRST_AUDIO.observe(time.time() - start_time)
+                first_audio = False
+            yield block
+    for block in decoder.flush():
+        yield block
+    TTS_LATENCY.observe(time.time() - start_time)
+
+
+@profiled("tts_pydub")
+def _decode_mp3_pydub(data: bytes) -> np.ndarray:
+    """整段MP3经pydub(ffmpeg子进程)解码为播放采样率的int16 PCM"""
+    audio = AudioSegment.from_mp3(io.BytesIO(data))
+    audio = audio.set_channels(1).set_frame_rate(CONFIG["sample_rate"])
+    return np.array(audio.get_array_of_samples())
+
+
+async def text_to_speech(text, voice=None):
     """将文本转换为语音"""
     if not text:
         return None
-    
+
     logger.info("🔊 语音合成中...")
+    start_time = time.time()
     try:
-        tts = edge_tts.Communicate(text=text, voice=CONFIG["voice"])
-        audio_data = b''
+        if av is not None:
+            blocks = [block async for block in synthesize_stream(text, voice)]
+            return np.concatenate(blocks) if blocks else None
+
+        tts = edge_tts.Communicate(text=text, voice=voice or CONFIG["voice"])
+        chunks = []
         async for chunk in tts.stream():
             if chunk["type"] == "audio":
-                audio_data += chunk["data"]
-        
-        if audio_data:
-            audio = AudioSegment.from_mp3(io.BytesIO(audio_data))
-            return np.array(audio.get_array_of_samples())
+                chunks.append(chunk["data"])
+
+        if chunks:
+            pcm = _decode_mp3_pydub(b"".join(chunks))
+            TTS_LATENCY.observe(time.time() - start_time)
+            return pcm
         return None
     except Exception as e:
         logger.error(f"❌ TTS失败: {e}")
         return None
 
+async def stream_blocks(text, voice=None):
+    """逐块产出合成的PCM；未安装PyAV时退回整段合成"""
+    if av is not None:
+        async for block in synthesize_stream(text, voice):
+            yield block
+    else:
+        audio = await text_to_speech(text, voice)
+        if audio is not None:
+            yield audio
+
+
+def _open_output():
+    with portaudio_lock:
+        stream = sd.OutputStream(samplerate=CONFIG["sample_rate"], channels=1, dtype=np.int16)
+        stream.start()
+        return stream
+
+
+def _close_output(stream):
+    with portaudio_lock:
+        stream.close()
+
+
+async def play_blocks(blocks):
+    """按到达顺序播放PCM块"""
+    try:
+        with playback():
+            stream = await asyncio.to_thread(_open_output)
+            try:
+                async for block in blocks:
+                    await asyncio.to_thread(stream.write, block)
+            finally:
+                await asyncio.to_thread(_close_output, stream)
+    except Exception as e:
+        logger.error(f"❌ 流式播放失败: {e}")
+
+
+async def speak_stream(text, voice=None):
+    """边合成边播放，首个MP3帧解码后即开始出声"""
+    if not text:
+        return
+    if av is None:
+        play(await text_to_speech(text, voice))
+        return
+
+    logger.info("🔊 流式语音合成中...")
+    await play_blocks(synthesize_stream(text, voice))
+
 def play(audio_data):
     """播放音频"""
     if audio_data is not None:
         try:
-            sd.play(audio_data, samplerate=CONFIG["sample_rate"])
-            sd.wait()
+            with playback():
+                with portaudio_lock:
+                    sd.play(audio_data, samplerate=CONFIG["sample_rate"])
+                sd.wait()
         except Exception as e:
             logger.error(f"❌ 播放失败: {e}")
 
@@ -15,64 +15,210 @@ os.environ["CT2_FORCE_CPU_ONLY"] = "1"
 
 import psutil
 import gc
+import sys
 import time
+import threading
+from collections import deque
 from typing import Dict, List, Callable
 import logging
+from config import CONFIG
 
 memory_logger = logging.getLogger('memory')
 
+# 分级清理：缓存裁剪 → 分代GC → 模型卸载
+CLEANUP_TIERS = ("cache", "gc", "model")
+
 class MemoryManager:
-    ""内存管理器"""
+    """内存管理器 - 后台采样RSS并检测增长趋势，越过阈值时在空闲期分级清理"""
     
     def __init__(self):
-        self.memory_threshold = CONFIG["memory_threshold_mb"]
-        self.cleanup_callbacks = []
+        self.config = CONFIG["memory_governor"]
+        self.memory_threshold = CONFIG["memory_threshold"]  # 系统内存占用百分比
+        self.cleanup_callbacks = {tier: [] for tier in CLEANUP_TIERS}
+        self.callback_stats = {}
         self.memory_history = []
+        self.samples = deque(maxlen=self.config["trend_window"])
+        
+        self._process = psutil.Process()
+        self._busy = False
+        self._idle_since = time.time()
+        self._pending_tier = None
+        self._pending_reason = ""
+        self._last_cleanup = {tier: 0.0 for tier in CLEANUP_TIERS}
+        self._leak_warned_at = 0.0
+        self._lock = threading.Lock()
+        # 清理执行期间持有；mark_busy需先获取，保证清理不会与对话重叠
+        self._cleanup_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
     
     def get_memory_usage(self) -> Dict[str, float]:
         try:
-            process = psutil.Process()
-            memory_info = process.memory_info()
+            memory_info = self._process.memory_info()
             return {
                 "rss_mb": memory_info.rss / 1024 / 1024,
                 "vms_mb": memory_info.vms / 1024 / 1024,
-                "percent": process.memory_percent()
+                "percent": self._process.memory_percent()
             }
         except Exception as e:
             memory_logger.error(f"获取内存信息失败: {e}")
             return {"rss_mb": 0, "vms_mb": 0, "percent": 0}
     
-    def force_cleanup(self, reason: str = "定期清理"):
-        memory_logger.info(f"🧹 开始内存清理: {reason}")
-        
-        before_memory = self.get_memory_usage()
-        
-        for callback in self.cleanup_callbacks:
+    def _rss_mb(self) -> float:
+        return self._process.memory_info().rss / 1024 / 1024
+    
+    def add_cleanup_callback(self, callback: Callable, tier: str = "cache", name: str = None):
+        if tier not in self.cleanup_callbacks:
+            raise ValueError(f"未知清理级别: {tier}")
+        name = name or getattr(callback, "__qualname__", repr(callback))
+        self.cleanup_callbacks[tier].append((name, callback))
+    
+    # ---- 后台调度 ----
+    
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="memory-governor", daemon=True)
+        self._thread.start()
+        memory_logger.info("🧠 内存监控已启动")
+    
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+    
+    def mark_busy(self):
+        """对话开始：清理正在执行时等待其完成，之后直到mark_idle都不会开始清理"""
+        with self._cleanup_lock:
+            self._busy = True
+    
+    def mark_idle(self):
+        """对话结束，空闲一段时间后可执行挂起的清理"""
+        self._busy = False
+        self._idle_since = time.time()
+    
+    def _run(self):
+        interval = self.config["sample_interval"]
+        while not self._stop_event.wait(interval):
             try:
-                callback()
+                self._tick()
             except Exception as e:
-                memory_logger.error(f"清理回调失败: {e}")
+                memory_logger.error(f"内存监控失败: {e}")
+    
+    def _tick(self):
+        now = time.time()
+        rss_mb = self._rss_mb()
+        self.samples.append((now, rss_mb))
+        
+        tier, reason = self._evaluate(rss_mb)
+        if tier is not None and now - self._last_cleanup[tier] >= self.config["cleanup_cooldown"]:
+            with self._lock:
+                if self._pending_tier is None or CLEANUP_TIERS.index(tier) > CLEANUP_TIERS.index(self._pending_tier):
+                    self._pending_tier, self._pending_reason = tier, reason
+        
+        if self._pending_tier is not None and not self._busy \
+                and now - self._idle_since >= self.config["idle_grace"]:
+            with self._cleanup_lock:
+                # 加锁后再确认一次，期间可能已开始新的对话
+                if self._busy:
+                    return
+                with self._lock:
+                    tier, reason = self._pending_tier, self._pending_reason
+                    self._pending_tier = None
+                self.run_cleanup(tier, reason)
+    
+    def get_trend(self) -> float:
+        """RSS增长斜率(MB/分钟)，最小二乘拟合采样窗口"""
+        if len(self.samples) < 3:
+            return 0.0
+        t0 = self.samples[0][0]
+        xs = [t - t0 for t, _ in self.samples]
+        ys = [rss for _, rss in self.samples]
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        variance = sum((x - mean_x) ** 2 for x in xs)
+        if variance == 0:
+            return 0.0
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+        return slope * 60
+    
+    def _evaluate(self, rss_mb: float):
+        """根据阈值和增长趋势决定清理级别"""
+        if rss_mb > self.config["rss_hard_mb"] or self._process.memory_percent() > self.memory_threshold:
+            return "model", f"内存超过硬阈值 ({rss_mb:.0f} MB)"
+        if rss_mb > self.config["rss_soft_mb"]:
+            return "gc", f"内存超过软阈值 ({rss_mb:.0f} MB)"
+        
+        # 采样窗口填满后才判断持续增长，避免启动加载被误判
+        if len(self.samples) == self.samples.maxlen:
+            slope = self.get_trend()
+            if slope > self.config["leak_slope_mb_per_min"]:
+                now = time.time()
+                if now - self._leak_warned_at > self.config["sample_interval"] * self.samples.maxlen:
+                    self._leak_warned_at = now
+                    memory_logger.warning(f"⚠️ 疑似内存泄漏: RSS持续增长 {slope:.1f} MB/分钟")
+                return "cache", f"内存持续增长 ({slope:.1f} MB/分钟)"
+        return None, ""
+    
+    # ---- 清理执行 ----
+    
+    def run_cleanup(self, tier: str = "cache", reason: str = "定期清理", full_gc: bool = False):
+        """执行到指定级别为止的所有清理，记录每个回调释放的内存"""
+        memory_logger.info(f"🧹 开始内存清理[{tier}]: {reason}")
+        before_mb = self._rss_mb()
+        collected = 0
         
-        collected = gc.collect()
-        after_memory = self.get_memory_usage()
-        memory_freed = before_memory["rss_mb"] - after_memory["rss_mb"]
+        for level in CLEANUP_TIERS[:CLEANUP_TIERS.index(tier) + 1]:
+            for name, callback in self.cleanup_callbacks[level]:
+                self._run_callback(name, callback)
+            if level == "gc":
+                # 只回收年轻代，避免全量GC的长停顿
+                collected += gc.collect(1)
+            elif level == "model":
+                collected += gc.collect()
+        if full_gc and tier != "model":
+            collected += gc.collect()
         
+        after_mb = self._rss_mb()
+        memory_freed = before_mb - after_mb
+        self._last_cleanup[tier] = time.time()
         memory_logger.info(f"✅ 内存清理完成: 释放 {memory_freed:.1f} MB, 回收 {collected} 个对象")
         
+        from metrics import CLEANUP_RUNS, CLEANUP_FREED
+        CLEANUP_RUNS.labels(tier).inc()
+        CLEANUP_FREED.inc(max(memory_freed, 0.0))
+        
         self.memory_history.append({
             "timestamp": time.time(),
-            "before_mb": before_memory["rss_mb"],
-            "after_mb": after_memory["rss_mb"],
+            "before_mb": before_mb,
+            "after_mb": after_mb,
             "freed_mb": memory_freed,
             "collected_objects": collected,
+            "tier": tier,
             "reason": reason
         })
         
         if len(self.memory_history) > 100:
             self.memory_history = self.memory_history[-50:]
     
-    def add_cleanup_callback(self, callback: Callable):
-        self.cleanup_callbacks.append(callback)
+    def _run_callback(self, name: str, callback: Callable):
+        before_mb = self._rss_mb()
+        try:
+            callback()
+        except Exception as e:
+            memory_logger.error(f"清理回调失败 {name}: {e}")
+            return
+        freed = before_mb - self._rss_mb()
+        stats = self.callback_stats.setdefault(name, {"runs": 0, "freed_mb": 0.0})
+        stats["runs"] += 1
+        stats["freed_mb"] += freed
+        memory_logger.debug(f"🧹 {name}: 释放 {freed:.2f} MB")
+    
+    def force_cleanup(self, reason: str = "手动清理"):
+        """立即执行缓存和GC级清理（不卸载模型）"""
+        self.run_cleanup("gc", reason, full_gc=True)
     
     def print_stats(self):
         if not self.memory_history:
@@ -82,7 +228,9 @@ class MemoryManager:
         total_freed = sum(h["freed_mb"] for h in self.memory_history)
         avg_freed = total_freed / total_cleanups
         
-        memory_logger.info(f"📊 内存清理统计: 总次数 {total_cleanups}, 总释放 {total_freed:.1f} MB, 平均 {avg_freed:.1f} MB")
+        memory_logger.info(f"📊 内存清理统计: 总次数 {total_cleanups}, 总释放 {total_freed:.1f} MB, 平均 {avg_freed:.1f} MB, 趋势 {self.get_trend():+.1f} MB/分钟")
+        for name, stats in sorted(self.callback_stats.items(), key=lambda item: -item[1]["freed_mb"]):
+            memory_logger.info(f"   {name}: {stats['runs']} 次, 释放 {stats['freed_mb']:.1f} MB")
 
 class AudioBufferCleaner:
     def __init__(self, audio_manager):
@@ -91,6 +239,9 @@ class AudioBufferCleaner:
     def cleanup(self):
         try:
             with self.audio_manager.lock:
+                # 录音中（监听窗口或对话）的缓冲区是有效数据，不清理
+                if state.is_recording:
+                    return
                 self.audio_manager.audio_buffer.clear()
                 if hasattr(self.audio_manager, '_temp_audio'):
                     del self.audio_manager._temp_audio
@@ -117,6 +268,20 @@ class WhisperModelCleaner:
         except Exception as e:
             whisper_logger.error(f"Whisper模型清理失败: {e}")
 
+class ColorFormatter(logging.Formatter):
+    """按日志级别着色的控制台格式"""
+    COLORS = {"DEBUG": "\033[36m", "INFO": "\033[32m", "WARNING": "\033[33m",
+              "ERROR": "\033[31m", "CRITICAL": "\033[35m"}
+    RESET = "\033[0m"
+
+    def __init__(self):
+        super().__init__('%(asctime)s [%(name)s] %(levelname)s %(message)s', '%H:%M:%S')
+
+    def format(self, record):
+        message = super().format(record)
+        color = self.COLORS.get(record.levelname)
+        return f"{color}{message}{self.RESET}" if color else message
+
 # 添加缺失的日志器定义
 class SimpleLogger:
     "简化日志器"
@@ -125,6 +290,7 @@ class SimpleLogger:
         self.logger = logging.getLogger(name)
         self.logger.setLevel(getattr(logging, level.upper()))
         self.logger.handlers.clear()
+        self.logger.propagate = False
         
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setFormatter(ColorFormatter())
@@ -150,7 +316,7 @@ user_logger = SimpleLogger("user")
 logger = SimpleLogger("main")
 
 class StructuredLogger:
-    ""结构化日志器""
+    """结构化日志器"""
     
     def __init__(self, base_logger: SimpleLogger):
         self.base_logger = base_logger
@@ -168,3 +334,21 @@ class StructuredLogger:
         else:
             duration_str = f"{duration:.3f}秒"
         self.base_logger.info(f"⏱️ {operation} 耗时: {duration_str}")
+
+    def log_success(self, message: str):
+        self.base_logger.info(f"✅ {message}")
+
+    def log_error(self, message: str, details: str = ""):
+        self.base_logger.error(f"❌ {message}" + (f" - {details}" if details else ""))
+
+structured_logger = StructuredLogger(system_logger)
+
+class AssistantState:
+    """跨模块共享的运行状态"""
+
+    def __init__(self):
+        self.is_recording = False
+        self.is_speaking = False
+        self.conversation_count = 0
+
+state = AssistantState()
@@ -0,0 +1,229 @@
+# 领域词汇模块：为Whisper提供热词/提示词偏置和拼音近音纠错
+# 提示词只在词表变化时重新编码；纠错使用预计算的拼音索引
+import re
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from config import CONFIG
+from utils import whisper_logger
+from metrics import CACHE_REQUESTS, registry
+
+try:
+    from pypinyin import Style, pinyin
+except ImportError:  # 未安装pypinyin时仅做提示词偏置
+    pinyin = None
+
+VOCAB_CORRECTIONS = registry.counter("stt_vocabulary_corrections_total", "拼音近音纠错次数")
+
+_HAN_PATTERN = re.compile(r'[一-鿿]')
+_HAN_RUN_PATTERN = re.compile(r'[一-鿿]+')
+
+# 模糊音：平翘舌、前后鼻音、n/l不分
+_FUZZY_INITIALS = (("zh", "z"), ("ch", "c"), ("sh", "s"), ("n", "l"))
+_FUZZY_FINALS = (("ing", "in"), ("eng", "en"), ("ang", "an"))
+# 模糊音归一后仍可能听混的声母/韵母，只有这类音节才算近音；其余不同的音节一律不替换
+_CONFUSABLE_INITIALS = frozenset(map(frozenset, (("f", "h"), ("r", "l"))))
+_CONFUSABLE_FINALS = frozenset(map(frozenset, (("o", "uo"), ("ei", "ui"), ("ie", "ue"))))
+_INITIALS = frozenset("bpmfdtnlgkhjqxrzcsyw")
+
+
+def _normalize_syllable(syllable: str) -> str:
+    for src, dst in _FUZZY_INITIALS:
+        if syllable.startswith(src):
+            syllable = dst + syllable[len(src):]
+            break
+    for src, dst in _FUZZY_FINALS:
+        if syllable.endswith(src):
+            syllable = syllable[:-len(src)] + dst
+            break
+    return syllable
+
+
+def _split_syllable(syllable: str) -> Tuple[str, str]:
+    """拆成声母和韵母（已做模糊音归一，不含zh/ch/sh）"""
+    initial = syllable[0] if syllable[:1] in _INITIALS else ""
+    return initial, syllable[len(initial):]
+
+
+def sounds_close(a: str, b: str) -> bool:
+    """两个不同音节是否近音：声母相同且韵母易混，或韵母相同且声母易混"""
+    initial_a, final_a = _split_syllable(a)
+    initial_b, final_b = _split_syllable(b)
+    if initial_a == initial_b:
+        return frozenset((final_a, final_b)) in _CONFUSABLE_FINALS
+    if final_a == final_b:
+        return frozenset((initial_a, initial_b)) in _CONFUSABLE_INITIALS
+    return False
+
+
+def near_miss_distance(syllables: Tuple[str, ...], readings) -> Optional[int]:
+    """近音音节数；有任何音节与词语读音既不相同也不近音时返回None"""
+    distance = 0
+    for syllable, candidates in zip(syllables, readings):
+        if syllable in candidates:
+            continue
+        if not any(sounds_close(syllable, reading) for reading in candidates):
+            return None
+        distance += 1
+    return distance
+
+
+@lru_cache(maxsize=8192)
+def char_readings(char: str) -> Optional[frozenset]:
+    """单字所有读音（含多音字，已做模糊音归一），非汉字返回None"""
+    if not _HAN_PATTERN.match(char):
+        return None
+    readings = pinyin(char, style=Style.NORMAL, heteronym=True)[0]
+    return frozenset(_normalize_syllable(r) for r in readings)
+
+
+def word_syllables(word: str) -> Tuple[str, ...]:
+    """按词语上下文取拼音，比逐字取音更准确"""
+    return tuple(_normalize_syllable(s) for s in
+                 (item[0] for item in pinyin(word, style=Style.NORMAL)))
+
+
+def tone_syllables(text: str) -> List[Optional[str]]:
+    """逐字的带声调拼音（按上下文取音，不做模糊音归一），非汉字为None"""
+    result: List[Optional[str]] = [None] * len(text)
+    for match in _HAN_RUN_PATTERN.finditer(text):
+        for k, item in enumerate(pinyin(match.group(), style=Style.TONE3)):
+            result[match.start() + k] = item[0]
+    return result
+
+
+class VocabularyBias:
+    """领域词汇偏置器"""
+
+    def __init__(self):
+        self.config = CONFIG["vocabulary"]
+        self._words_key = None
+        self._tokenizer_id = None
+        self.prompt_text = ""
+        self.prompt_tokens: Optional[Tuple[int, ...]] = None
+        # {词长: [(模糊音拼音元组, 带声调拼音元组, 词语)]}
+        self.pinyin_index: Dict[int, List[Tuple[Tuple[str, ...], Tuple[str, ...], str]]] = {}
+        self.stats = {
+            "prompt_encodes": 0,
+            "prompt_encode_time": 0.0,
+            "param_calls": 0,
+            "param_time": 0.0,
+            "corrections": 0,
+            "correction_calls": 0,
+            "correction_time": 0.0,
+        }
+
+    def _refresh(self, whisper_model):
+        """词表或模型变化时重建提示词编码和拼音索引"""
+        words = tuple(self.config["words"])
+        tokenizer = whisper_model.hf_tokenizer
+        if words == self._words_key and id(tokenizer) == self._tokenizer_id:
+            CACHE_REQUESTS.labels("vocabulary_prompt", "hit").inc()
+            return
+        CACHE_REQUESTS.labels("vocabulary_prompt", "miss").inc()
+
+        start_time = time.perf_counter()
+        self.prompt_text = self.config["prompt_template"].format(words="、".join(words)) if words else ""
+        if self.prompt_text:
+            # 与faster-whisper处理字符串initial_prompt的方式一致
+            ids = tokenizer.encode(" " + self.prompt_text.strip(), add_special_tokens=False).ids
+            limit = whisper_model.max_length // 2 - 1
+            self.prompt_tokens = tuple(ids[-limit:])
+        else:
+            self.prompt_tokens = None
+        self.stats["prompt_encodes"] += 1
+        self.stats["prompt_encode_time"] += time.perf_counter() - start_time
+
+        self.pinyin_index = {}
+        if pinyin is not None and self.config["pinyin_correction"]:
+            for word in words:
+                if len(word) >= 2 and all(_HAN_PATTERN.match(c) for c in word):
+                    self.pinyin_index.setdefault(len(word), []).append(
+                        (word_syllables(word), tuple(tone_syllables(word)), word))
+
+        self._words_key = words
+        self._tokenizer_id = id(tokenizer)
+        whisper_logger.info(f"📚 领域词汇已更新: {len(words)} 个词, 提示词 {len(self.prompt_tokens or ())} tokens")
+
+    def get_decode_params(self, whisper_model) -> dict:
+        """返回追加到transcribe参数中的提示词（已预编码的token）"""
+        start_time = time.perf_counter()
+        self._refresh(whisper_model)
+        params = {}
+        if self.prompt_tokens:
+            params["initial_prompt"] = self.prompt_tokens
+        if self.config["use_hotwords"] and self._words_key:
+            # faster-whisper对hotwords字符串每段都会重新编码
+            params["hotwords"] = " ".join(self._words_key)
+        self.stats["param_calls"] += 1
+        self.stats["param_time"] += time.perf_counter() - start_time
+        return params
+
+    def correct(self, text: str, avg_logprob: float = None) -> str:
+        """将与词表拼音相近的片段替换为词表词语
+
+        Args:
+            text: 识别文本（一个解码片段）
+            avg_logprob: 该片段的平均对数概率，高于correction_max_logprob时解码器有把握，不纠错
+        """
+        if not text or not self.pinyin_index:
+            return text
+        max_logprob = self.config["correction_max_logprob"]
+        if avg_logprob is not None and max_logprob is not None and avg_logprob > max_logprob:
+            return text
+        start_time = time.perf_counter()
+        max_distance = self.config["max_pinyin_distance"]
+        lengths = sorted(self.pinyin_index, reverse=True)
+        readings = [char_readings(c) for c in text]
+        tones = None
+
+        result = []
+        i = 0
+        while i < len(text):
+            replacement = None
+            for length in lengths:
+                if i + length > len(text) or None in readings[i:i + length]:
+                    continue
+                window = text[i:i + length]
+                for syllables, tone_word, word in self.pinyin_index[length]:
+                    if window == word:
+                        replacement = word
+                        break
+                    if length < 3:
+                        # 短词的模糊音近似太多（小子/小字→小智），只替换按上下文读音完全相同（含声调）的片段
+                        if tones is None:
+                            tones = tone_syllables(text)
+                        if tuple(tones[i:i + length]) == tone_word:
+                            replacement = word
+                            break
+                        continue
+                    distance = near_miss_distance(syllables, readings[i:i + length])
+                    if distance is not None and distance <= max_distance:
+                        replacement = word
+                        break
+                if replacement is not None:
+                    break
+
+            if replacement is not None:
+                if text[i:i + len(replacement)] != replacement:
+                    whisper_logger.debug(f"📚 纠错: {text[i:i + len(replacement)]} → {replacement}")
+                    self.stats["corrections"] += 1
+                    VOCAB_CORRECTIONS.inc()
+                result.append(replacement)
+                i += len(replacement)
+            else:
+                result.append(text[i])
+                i += 1
+
+        self.stats["correction_calls"] += 1
+        self.stats["correction_time"] += time.perf_counter() - start_time
+        return "".join(result)
+
+    def get_stats(self) -> dict:
+        calls = self.stats["param_calls"] or 1
+        correction_calls = self.stats["correction_calls"] or 1
+        return {
+            **self.stats,
+            "avg_param_ms": self.stats["param_time"] / calls * 1000,
+            "avg_correction_ms": self.stats["correction_time"] / correction_calls * 1000,
+        }
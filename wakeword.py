@@ -1,60 +1,187 @@
 # 唤醒词检测模块：基于openwakeword实现低功耗唤醒词识别
-# 提供唤醒词检测、模型管理和置信度评分功能
+# 提供多唤醒词检测（共享特征提取，单次predict）、逐词阈值/耐心/冷却和推理耗时统计
+import os
+import time
+from typing import Dict, NamedTuple, Optional
 from openwakeword import Model
 import numpy as np
 from config import CONFIG
+from metrics import WAKE_FRAMES_INFERRED, WAKE_FRAMES_GATED, registry
+from profiling import profiled
 import logging
 
 error_logger = logging.getLogger('error')
 system_logger = logging.getLogger('system')
+
+WAKE_INFERENCE = registry.histogram(
+    "wake_inference_seconds", "唤醒模型单帧推理耗时（preprocessor为共享特征提取）", ["model"],
+    (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1)
+)
+WAKE_DETECTIONS = registry.counter("wake_detections_total", "唤醒次数", ["word"])
+
+
+class WakeEvent(NamedTuple):
+    word: str
+    model: str
+    score: float
+    profile: dict
+
+
+def _model_key(model_path: str) -> str:
+    """与openwakeword一致：文件路径取文件名，预训练模型名原样使用"""
+    if os.path.exists(model_path):
+        return os.path.splitext(os.path.basename(model_path))[0]
+    return model_path
+
+
+class _WakeWord:
+    """单个唤醒词的判定状态"""
+
+    def __init__(self, spec: dict, defaults: dict):
+        self.model_path = spec["model_path"]
+        self.key = _model_key(self.model_path)
+        self.word = spec.get("word", self.key)
+        self.threshold = spec.get("threshold", defaults["threshold"])
+        self.patience = spec.get("patience", defaults["min_activation_count"])
+        self.cooldown = spec.get("cooldown", defaults["cooldown"])
+        self.profile_name = spec.get("profile", "default")
+        self.hits = 0
+        self.last_trigger = 0.0
+
+    def update(self, score: float, now: float) -> bool:
+        """连续patience帧超过阈值且不在冷却期内时触发"""
+        self.hits = self.hits + 1 if score >= self.threshold else 0
+        if self.hits >= self.patience and now - self.last_trigger >= self.cooldown:
+            self.hits = 0
+            self.last_trigger = now
+            return True
+        return False
+
+
 class WakeWordDetector:
     def __init__(self):
         self.config = CONFIG["openwakeword"]
+        specs = self.config["models"] or [{"model_path": self.config["model_path"]}]
+        self.words: Dict[str, _WakeWord] = {}
+        for spec in specs:
+            word = _WakeWord(spec, self.config)
+            self.words[word.key] = word
+        self._pending = np.zeros(0, dtype=np.int16)
+        # 已送入的音频在采集流中的结束偏移，用于判断下一段是否与之相连
+        self._pending_end: Optional[int] = None
+        # {模型名: [累计耗时, 帧数]}，preprocessor为所有模型共享的特征提取
+        self.inference_time: Dict[str, list] = {}
         try:
             self.model = Model(
-                wakeword_models=[self.config["model_path"]],
+                wakeword_models=[w.model_path for w in self.words.values()],
                 inference_framework=self.config["inference_framework"],
                 enable_speex_noise_suppression=self.config["enable_speex_noise_suppression"]
             )
-            system_logger.info("✅ openwakeword模型加载成功")
+            system_logger.info(f"✅ openwakeword模型加载成功: {', '.join(w.word for w in self.words.values())}")
         except Exception as e:
             error_logger.error(f"❌ openwakeword加载失败: {e}")
             self.model = None
-    
-    def detect(self, audio_chunk: np.ndarray) -> tuple[bool, float]:
+
+    def reset(self):
+        """丢弃未满一帧的残留采样，新的监听窗口或音频流开始时调用"""
+        self._pending = np.zeros(0, dtype=np.int16)
+        self._pending_end = None
+
+    def _to_frames(self, audio: np.ndarray):
+        """转换为int16并按buffer_size切帧，不足一帧的尾部留到下次"""
+        audio = np.asarray(audio).reshape(-1)
+        if audio.dtype != np.int16:
+            audio = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        if len(self._pending):
+            audio = np.concatenate((self._pending, audio))
+        frame_size = self.config["buffer_size"]
+        usable = len(audio) - len(audio) % frame_size
+        self._pending = audio[usable:].copy()
+        return [audio[i:i + frame_size] for i in range(0, usable, frame_size)]
+
+    @profiled("wake_inference")
+    def _predict(self, frame: np.ndarray) -> dict:
+        """所有唤醒词模型一次predict：特征只提取一次，各模型只跑分类头"""
+        prediction, timing = self.model.predict(frame, timing=True)
+        WAKE_FRAMES_INFERRED.inc()
+        for name, seconds in timing["models"].items():
+            totals = self.inference_time.setdefault(name, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+            WAKE_INFERENCE.labels(name).observe(seconds)
+        return prediction
+
+    def detect_event(self, audio: np.ndarray, offset: Optional[int] = None) -> tuple[Optional[WakeEvent], float]:
         """
         检测唤醒词
-        
+
         Args:
-            audio_chunk: 音频数据
-            
+            audio: 音频数据（int16或[-1, 1]浮点），任意长度
+            offset: audio在采集流中的起始采样偏移；与上一段首尾相接时才拼接残留采样，否则视为新窗口
+
         Returns:
-            (是否唤醒, 置信度分数)
+            (唤醒事件或None, 最高置信度分数)
         """
         if self.model is None:
-            return False, 0.0
-            
+            WAKE_FRAMES_GATED.inc()
+            return None, 0.0
+
+        if offset is None or offset != self._pending_end:
+            self.reset()
+        best_score = 0.0
         try:
-            # 确保音频数据格式正确
-            if len(audio_chunk) != self.config["buffer_size"]:
-                return False, 0.0
-                
-            prediction = self.model.predict(audio_chunk)
-            
-            for model_name, score in prediction.items():
-                if score > self.config["threshold"]:
-                    return True, score
-                    
-            return False, max(prediction.values()) if prediction else 0.0
-            
+            if offset is not None:
+                self._pending_end = offset + len(audio)
+            frames = self._to_frames(audio)
+            if not frames:
+                WAKE_FRAMES_GATED.inc()
+            for frame in frames:
+                prediction = self._predict(frame)
+                now = time.time()
+                triggered = None
+                for key, score in prediction.items():
+                    word = self.words.get(key)
+                    if word is None:
+                        continue
+                    best_score = max(best_score, float(score))
+                    if word.update(float(score), now) and (triggered is None or score > triggered[1]):
+                        triggered = (word, float(score))
+                if triggered is not None:
+                    word, score = triggered
+                    WAKE_DETECTIONS.labels(word.word).inc()
+                    self.reset()
+                    profile = CONFIG["wake_profiles"].get(word.profile_name, CONFIG["wake_profiles"]["default"])
+                    return WakeEvent(word.word, word.key, score, profile), score
+            return None, best_score
+
         except Exception as e:
             error_logger.error(f"openwakeword检测错误: {e}")
-            return False, 0.0
-    
+            return None, best_score
+
+    def detect(self, audio_chunk: np.ndarray) -> tuple[bool, float]:
+        """检测任一唤醒词，返回(是否唤醒, 置信度分数)"""
+        event, score = self.detect_event(audio_chunk)
+        return event is not None, score
+
+    def get_inference_stats(self) -> dict:
+        """单帧平均推理耗时(ms)：preprocessor为共享特征提取，其余为各唤醒词模型"""
+        return {name: total / count * 1000 for name, (total, count) in self.inference_time.items() if count}
+
+    def print_inference_stats(self):
+        stats = self.get_inference_stats()
+        if not stats:
+            return
+        per_frame = sum(stats.values())
+        details = ", ".join(f"{k} {v:.2f}ms" for k, v in stats.items())
+        system_logger.info(f"🎯 唤醒推理: 每帧 {per_frame:.2f}ms ({details})")
+
     def get_model_info(self) -> dict:
-        ""获取模型信息"""
+        """获取模型信息"""
         return {
             "loaded": self.model is not None,
             "models": list(self.model.models.keys()) if self.model else [],
+            "words": {w.key: {"word": w.word, "threshold": w.threshold, "patience": w.patience,
+                              "cooldown": w.cooldown, "profile": w.profile_name}
+                      for w in self.words.values()},
             "framework": self.config["inference_framework"]
-        }
\ No newline at end of file
+        }